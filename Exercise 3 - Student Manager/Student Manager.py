@@ -1,62 +1,242 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 import os
-
-DATA_FILE = "studentmarks.text.txt"
-MAX_CW = 20
-MAX_EXAM = 100
-
-def load_students():
-    """Loads student data from the file, handling potential bad data."""
-    if not os.path.exists(DATA_FILE):
-        return []
-
-    students = []
-    with open(DATA_FILE, "r") as f:
-        for line in f:
-            parts = line.strip().split(",")
-            if len(parts) != 6:
-                continue
-            code, name, c1, c2, c3, exam = parts
+import sys
+import json
+import math
+import time
+import queue
+import threading
+import cProfile
+import functools
+from collections import deque
+from bisect import bisect_right
+
+from student_core import (
+    DATA_FILE, MAX_CW, MAX_EXAM, MAX_TOTAL, MARK_COLUMNS, STAT_PERCENTILES,
+    Cancelled, ConflictError, Student, StudentStore, student_key, validate_field, validate_marks,
+    name_sort_key, cohort_statistics, load_numpy, import_students, write_import_rejects, io_counters,
+    write_archive, restore_archive, parse_filter, FilterError, MarkDistribution, CohortSet, GRADE_BANDS,
+    export_report,
+)
+
+# How often the GUI checks the background worker for events
+WORKER_POLL_MS = 50
+
+# Tables with more rows than this only keep the visible rows in the Treeview
+VIRTUAL_ROW_THRESHOLD = 2000
+TREE_ROW_HEIGHT = 25
+
+# Small tables are filled this many rows per event-loop turn
+FILL_BATCH_ROWS = 500
+
+# How many name matches IndividualViewFrame lists while typing. Fuzzy
+# matches are only suggested once this many characters have been typed.
+SUGGESTION_LIMIT = 50
+FUZZY_MIN_CHARS = 3
+# Suggestions are looked up once typing pauses for this long
+SUGGESTION_DELAY_MS = 150
+
+# Charts merge mark values into wider bins rather than draw bars or cells
+# smaller than this many pixels, and redraw this long after the last resize
+CHART_MIN_BAR_PX = 4
+CHART_MIN_CELL_PX = 8
+CHART_REDRAW_MS = 50
+
+# Set STUDENT_MANAGER_TRACE=1, or pass --trace, to time GUI actions. The
+# last INSTRUMENT_EVENTS are kept and Ctrl+Shift+D shows the figures.
+INSTRUMENT = os.environ.get("STUDENT_MANAGER_TRACE") == "1" or "--trace" in sys.argv
+INSTRUMENT_EVENTS = 5000
+INSTRUMENT_PERCENTILES = (50, 95, 99)
+
+# Pass --no-fade, or set STUDENT_MANAGER_NO_FADE=1, to show the window at
+# once instead of fading it in over FADE_STEPS steps of FADE_STEP_MS
+FADE = not (os.environ.get("STUDENT_MANAGER_NO_FADE") == "1" or "--no-fade" in sys.argv)
+FADE_STEPS = 25
+FADE_STEP_MS = 25
+
+# Pass --startup-report, or set STUDENT_MANAGER_STARTUP=1, to print how long
+# each stage of starting up took. --trace turns it on too.
+STARTUP_REPORT = (os.environ.get("STUDENT_MANAGER_STARTUP") == "1" or "--startup-report" in sys.argv
+                  or INSTRUMENT)
+
+def server_url(argv):
+    """Returns the student_server.py address from --server URL or STUDENT_MANAGER_SERVER, if any."""
+    if "--server" in argv[:-1]:
+        return argv[argv.index("--server") + 1]
+    return os.environ.get("STUDENT_MANAGER_SERVER") or None
+
+# With a server address the GUI works on the server's records instead of
+# reading DATA_FILE itself (see student_server.py)
+SERVER_URL = server_url(sys.argv)
+
+
+
+#   INSTRUMENTATION
+
+class ActionLog:
+    """Ring buffer of timed GUI actions.
+
+    Each entry is (action, start, seconds, records, bytes read, bytes
+    written, thread id), with start counted from when the log was created.
+    Bytes are those read and written by the action's own thread, so the
+    loads and compactions on the BackgroundWorker show up as their own
+    "worker:" entries instead of inside the GUI action that was running.
+    A cProfile profiler runs inside the outermost GUI action only, so the
+    dump covers the instrumented actions and not the idle event loop.
+    """
+
+    def __init__(self, size=INSTRUMENT_EVENTS):
+        self.events = deque(maxlen=size)
+        self.profiler = cProfile.Profile()
+        self._depth = 0
+        self._origin = time.perf_counter()
+
+    def run(self, name, func, args, kwargs, store, profile=True):
+        """Calls func, logging it under name. Only the GUI thread profiles."""
+        read, written = io_counters.thread()
+        if profile:
+            self._depth += 1
+            if self._depth == 1:
+                self.profiler.enable()
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            if profile:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.profiler.disable()
+            read_after, written_after = io_counters.thread()
+            self.events.append((name, start - self._origin, elapsed, len(store),
+                                read_after - read, written_after - written, threading.get_ident()))
+
+    def summary(self):
+        """Returns {action: (calls, p50, p95, p99 in ms, last record count, bytes read, bytes written)}."""
+        grouped = {}
+        for name, start, elapsed, records, read, written, thread in self.events:
+            grouped.setdefault(name, []).append((elapsed, records, read, written))
+        summary = {}
+        for name, rows in grouped.items():
+            times = sorted(r[0] * 1000 for r in rows)
+            # Nearest-rank percentiles
+            cuts = [times[max(0, math.ceil(p / 100 * len(times)) - 1)] for p in INSTRUMENT_PERCENTILES]
+            summary[name] = (len(rows), *cuts, rows[-1][1], sum(r[2] for r in rows), sum(r[3] for r in rows))
+        return summary
+
+    def export_chrome_trace(self, path):
+        """Writes the actions as a Chrome trace, for chrome://tracing or Perfetto."""
+        pid = os.getpid()
+        events = [{
+            "name": name, "cat": "gui", "ph": "X", "pid": pid, "tid": thread,
+            "ts": start * 1e6, "dur": elapsed * 1e6,
+            "args": {"records": records, "bytes_read": read, "bytes_written": written},
+        } for name, start, elapsed, records, read, written, thread in self.events]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def dump_profile(self, path):
+        """Writes the profile of all instrumented actions so far, for pstats or snakeviz."""
+        self.profiler.dump_stats(path)
+
+action_log = ActionLog() if INSTRUMENT else None
+
+class StartupTimer:
+    """Milestones of starting the app, in seconds since this module was loaded.
+
+    "interactive" is when the cover page is drawn and fully faded in, so
+    the user can click it. The report is printed once that and the loading
+    of the records have both happened.
+    """
+
+    FINAL = ("interactive", "records loaded")
+
+    def __init__(self, enabled=STARTUP_REPORT):
+        self.enabled = enabled
+        self.origin = time.perf_counter()
+        self.marks = {}
+
+    def mark(self, name):
+        if name in self.marks:
+            return
+        self.marks[name] = time.perf_counter() - self.origin
+        if self.enabled and all(final in self.marks for final in self.FINAL) and name in self.FINAL:
+            print(self.report(), file=sys.stderr)
+
+    def report(self):
+        lines = ["Startup (ms since the GUI module loaded):"]
+        for name, seconds in sorted(self.marks.items(), key=lambda item: item[1]):
+            lines.append(f"  {name:<24}{seconds * 1000:>9.1f}")
+        return "\n".join(lines)
+
+startup = StartupTimer()
+
+def instrumented(func):
+    """Times a GUI action into action_log when instrumentation is switched on.
+
+    Without it the function is returned untouched, so there is no cost.
+    """
+    if action_log is None:
+        return func
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        controller = getattr(self, "controller", self)
+        return action_log.run(name, func, (self,) + args, kwargs, controller.store)
+    return wrapper
+
+
+
+#   BACKGROUND WORKER
+
+class BackgroundWorker:
+    """Runs data jobs one at a time on a worker thread.
+
+    A job is called as job(cancel, progress): cancel is a threading.Event it
+    should pass on to the data functions, and progress takes a fraction from
+    0 to 1. Tk must only be used from the main thread, so the outcome of
+    each job is put on `events` for the app to pick up with after().
+    """
+
+    def __init__(self, store=None):
+        # Only used to log record counts when instrumenting
+        self.store = store
+        self.events = queue.Queue()
+        self._jobs = queue.Queue()
+        self._current = None
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, job, on_done, message):
+        self._jobs.put((job, on_done, message, threading.Event()))
+
+    def cancel(self):
+        """Asks the running job to stop."""
+        current = self._current
+        if current is not None:
+            current.set()
+
+    def _run(self):
+        while True:
+            job, on_done, message, cancel = self._jobs.get()
+            self._current = cancel
+            self.events.put(("start", message))
+            progress = lambda fraction: self.events.put(("progress", fraction))
             try:
-                # Robustly attempt to convert marks to integers
-                students.append({
-                    "code": code,
-                    "name": name,
-                    "cw1": int(c1),
-                    "cw2": int(c2),
-                    "cw3": int(c3),
-                    "exam": int(exam),
-                })
-            except ValueError:
-                # Skip corrupted records and inform the user (optional, but good practice)
-                print(f"Skipping corrupted record: {line.strip()}")
-                continue
-    return students
-
-def save_students(students):
-    """Saves student data back to the file."""
-    with open(DATA_FILE, "w") as f:
-        for s in students:
-            # Ensure data being saved is correctly formatted
-            f.write(f"{s['code']},{s['name']},{s['cw1']},{s['cw2']},{s['cw3']},{s['exam']}\n")
-
-def validate_marks(cw1_str, cw2_str, cw3_str, exam_str):
-    """Validates mark inputs are integers and within defined limits."""
-    try:
-        cw1 = int(cw1_str)
-        cw2 = int(cw2_str)
-        cw3 = int(cw3_str)
-        exam = int(exam_str)
-    except ValueError:
-        return False, "All coursework and exam marks must be integers."
-
-    if not (0 <= cw1 <= MAX_CW and 0 <= cw2 <= MAX_CW and 0 <= cw3 <= MAX_CW):
-        return False, f"CW marks must be between 0 and {MAX_CW}."
-    if not (0 <= exam <= MAX_EXAM):
-        return False, f"Exam mark must be between 0 and {MAX_EXAM}."
-
-    return True, (cw1, cw2, cw3, exam)
+                if action_log is not None:
+                    name = "worker: " + getattr(job, "__qualname__", type(job).__name__)
+                    result = action_log.run(name, job, (cancel, progress), {}, self.store, profile=False)
+                else:
+                    result = job(cancel, progress)
+            except Cancelled:
+                self.events.put(("cancelled", message))
+            except Exception as e:
+                self.events.put(("error", e))
+            else:
+                self.events.put(("done", on_done, result))
+            finally:
+                self._current = None
 
 
 
@@ -65,8 +245,9 @@ def validate_marks(cw1_str, cw2_str, cw3_str, exam_str):
 class App(tk.Tk):
     def __init__(self):
         super().__init__()
+        startup.mark("window created")
         self.title("Student Manager System")
-        self.geometry("900x650")
+        self.geometry("900x760")
         self.resizable(True, True) 
         # Styling
         style = ttk.Style()
@@ -76,66 +257,257 @@ class App(tk.Tk):
         style.map("Primary.TButton", background=[('active', "#D6892C")])
         style.configure("Section.TLabel", font=("Helvetica", 18, "bold"), foreground="#54E5C8")
         style.configure("Treeview.Heading", font=("Helvetica", 12, "bold"))
-        style.configure("Treeview", font=("Consolas", 11), rowheight=25)
+        style.configure("Treeview", font=("Consolas", 11), rowheight=TREE_ROW_HEIGHT)
+
+        # One shared store for every frame. Loading, compaction and other
+        # heavy data work run on the worker thread, and store changes made
+        # there are handed to the frames on the main thread.
+        self.store = StudentStore(SERVER_URL or DATA_FILE)
+        self.store.compaction_hook = self.schedule_compaction
+        self.store.subscribe(self.queue_store_change)
+        self.store_listeners = []
+        self.store_changes = queue.Queue()
+
+        self.worker = BackgroundWorker(self.store)
+        self.pending_jobs = 0
+        self.deferred = []
+
+        # Busy bar, only shown while a background job is running
+        self.status = ttk.Frame(self, padding=5)
+        self.status_label = ttk.Label(self.status, text="")
+        self.status_label.pack(side="left", padx=5)
+        self.progress = ttk.Progressbar(self.status, mode="determinate", maximum=1.0)
+        self.progress.pack(side="left", fill="x", expand=True, padx=5)
+        ttk.Button(self.status, text="Cancel", command=self.worker.cancel).pack(side="right", padx=5)
 
         container = ttk.Frame(self)
         container.pack(fill="both", expand=True)
+        self.container = container
 
-        self.frames = {}
-        
-        for F in (CoverPage, MenuPage, ViewAllFrame, IndividualViewFrame, DataModificationFrame):
-            name = F.__name__
-            frame = F(container, self)
-            self.frames[name] = frame
-            frame.grid(row=0, column=0, sticky="nsew")
-        
         container.grid_rowconfigure(0, weight=1)
         container.grid_columnconfigure(0, weight=1)
 
-        self.attributes("-alpha", 0.0)
-        self.fade_in()
+        # Frames are built the first time they are shown (see get_frame),
+        # so startup only pays for the cover page
+        self.frames = {}
+        frames = (CoverPage, MenuPage, ViewAllFrame, IndividualViewFrame, DataModificationFrame, RankingFrame,
+                  StatisticsFrame, ChartsFrame, CohortsFrame)
+        if action_log is not None:
+            # Not on the menu; opened with Ctrl+Shift+D
+            frames += (DiagnosticsFrame,)
+            self.bind_all("<Control-Shift-D>", lambda e: self.show_frame("DiagnosticsFrame"))
+        self.frame_classes = {F.__name__: F for F in frames}
+
+        # The records load on the worker while the cover page is up
+        self.run_in_background(self.store.refresh, self.store_loaded, message="Loading student records...")
+        self.after(WORKER_POLL_MS, self.poll_worker)
+
+        if FADE:
+            self.attributes("-alpha", 0.0)
         self.show_frame("CoverPage")
+        startup.mark("cover page built")
+        self.after_idle(self.first_drawn)
+
+    def first_drawn(self):
+        startup.mark("cover page drawn")
+        if FADE:
+            self.fade_in()
+        else:
+            startup.mark("interactive")
+
+    def get_frame(self, name):
+        """Returns a frame, building it the first time it is asked for."""
+        frame = self.frames.get(name)
+        if frame is None:
+            frame = self.frames[name] = self.frame_classes[name](self.container, self)
+            frame.grid(row=0, column=0, sticky="nsew")
+        return frame
+
+    def store_loaded(self, changed):
+        startup.mark("records loaded")
+        # Index names for sorting and searching on a spare thread, so
+        # neither the first search nor the jobs queued behind the worker
+        # wait for it
+        threading.Thread(target=self.build_name_indexes, daemon=True).start()
+
+    def build_name_indexes(self):
+        self.store.build_name_index()
+        self.store.build_fuzzy_index()
 
     def fade_in(self):
         alpha = self.attributes("-alpha")
         if alpha < 1:
-            alpha += 0.04
+            alpha += 1 / FADE_STEPS
             self.attributes("-alpha", alpha)
-            self.after(25, self.fade_in)
+            self.after(FADE_STEP_MS, self.fade_in)
+        else:
+            startup.mark("interactive")
 
+    @instrumented
     def show_frame(self, name, **kwargs):
         """Switches to the specified frame and refreshes it if needed."""
-        frame = self.frames[name]
+        frame = self.get_frame(name)
         if hasattr(frame, "refresh"):
             # Pass  to refresh
             frame.refresh(**kwargs)
         frame.tkraise()
 
+    def subscribe(self, callback):
+        """Registers a frame for store changes, always delivered on the main thread."""
+        self.store_listeners.append(callback)
+
+    def queue_store_change(self, action, student, old):
+        if threading.current_thread() is threading.main_thread():
+            for callback in self.store_listeners:
+                callback(action, student, old)
+        else:
+            self.store_changes.put((action, student, old))
+
+    def schedule_compaction(self):
+        if threading.current_thread() is threading.main_thread():
+            self.run_in_background(self.store.compact, message="Compacting student records...")
+        else:
+            # Already on the worker thread, so just do it
+            self.store.compact()
+
+    def run_in_background(self, job, on_done=None, message="Working..."):
+        """Runs job(cancel, progress) on the worker thread, then on_done(result) here.
+
+        With message None the busy bar stays hidden, for quick jobs.
+        """
+        self.pending_jobs += 1
+        self.worker.submit(job, on_done, message)
+
+    def store_ready(self, retry):
+        """Returns True if the store can be used right now.
+
+        Otherwise (the file changed and needs reloading, or background jobs
+        are still running) retry is called once they have finished and
+        False is returned, so the caller can simply return.
+        """
+        if self.store.is_stale() and not self.deferred:
+            self.run_in_background(self.store.refresh, message="Loading student records...")
+        if self.pending_jobs:
+            self.deferred.append(retry)
+            return False
+        return True
+
+    def poll_worker(self):
+        """Applies background results, progress and store changes on the main thread."""
+        while not self.store_changes.empty():
+            change = self.store_changes.get()
+            for callback in self.store_listeners:
+                callback(*change)
+
+        while not self.worker.events.empty():
+            event = self.worker.events.get()
+            kind = event[0]
+            if kind == "start":
+                if event[1] is not None:
+                    self.status_label.config(text=event[1])
+                    self.progress.config(value=0)
+                    self.status.pack(side="bottom", fill="x", before=self.container)
+            elif kind == "progress":
+                self.progress.config(value=event[1])
+            else:
+                self.pending_jobs -= 1
+                if kind == "done":
+                    on_done, result = event[1], event[2]
+                    if on_done is not None:
+                        on_done(result)
+                elif kind == "error":
+                    self.deferred = []
+                    messagebox.showerror("Error", f"A background task failed:\n{event[1]}")
+                else:
+                    # Cancelled: drop whatever was waiting on it
+                    self.deferred = []
+
+                if not self.pending_jobs:
+                    self.status.pack_forget()
+                    deferred, self.deferred = self.deferred, []
+                    for retry in deferred:
+                        retry()
+
+        self.after(WORKER_POLL_MS, self.poll_worker)
+
+    def bulk_import(self):
+        """Asks for a CSV file and imports all of its valid rows at once."""
+        path = filedialog.askopenfilename(
+            title="Import Student Records",
+            filetypes=[("CSV files", "*.csv"), ("Text files", "*.txt"), ("All files", "*.*")],
+        )
+        if not path:
+            return
+
+        def job(cancel, progress):
+            self.store.refresh(cancel)
+            return import_students(path, self.store, cancel, progress)
+
+        def done(result):
+            accepted, rejected = result
+            message = f"Imported {accepted} record(s).\nRejected {len(rejected)} record(s)."
+            if rejected:
+                message += f"\n\nRejected rows and reasons were written to:\n{write_import_rejects(path, rejected)}"
+            messagebox.showinfo("Bulk Import", message)
+
+        self.run_in_background(job, done, message=f"Importing {os.path.basename(path)}...")
+
+    def export_snapshot(self):
+        """Asks where to save a compressed snapshot of every record and writes it."""
+        path = filedialog.asksaveasfilename(
+            title="Export Compressed Snapshot", defaultextension=".smz",
+            filetypes=[("Student archives", "*.smz"), ("All files", "*.*")],
+        )
+        if not path:
+            return
+
+        def job(cancel, progress):
+            self.store.refresh(cancel)
+            return write_archive(self.store.all(), path)
+
+        def done(count):
+            messagebox.showinfo("Export Snapshot", f"Saved {count} record(s) to:\n{path}")
+
+        self.run_in_background(job, done, message=f"Exporting {os.path.basename(path)}...")
+
+    def restore_snapshot(self):
+        """Asks for a compressed snapshot and replaces every record with its contents."""
+        path = filedialog.askopenfilename(
+            title="Restore Compressed Snapshot",
+            filetypes=[("Student archives", "*.smz"), ("All files", "*.*")],
+        )
+        if not path or not messagebox.askyesno(
+                "Restore Snapshot", "Replace ALL current student records with the snapshot?"):
+            return
+
+        def job(cancel, progress):
+            # A damaged archive raises ValueError, which the worker reports
+            return restore_archive(path, self.store, cancel, progress)
+
+        def done(count):
+            messagebox.showinfo("Restore Snapshot", f"Restored {count} record(s).")
+
+        self.run_in_background(job, done, message=f"Restoring {os.path.basename(path)}...")
+
+    @instrumented
     def show_top_bottom_record(self, mode):
         """Finds and displays the student with the highest or lowest total score."""
-        students = load_students()
-        if not students:
+        if not self.store_ready(lambda: self.show_top_bottom_record(mode)):
+            return
+        found = self.store.top(1) if mode == "highest" else self.store.bottom(1)
+        if not found:
             messagebox.showwarning("Warning", "No student data available!")
             return
 
-        for s in students:
-            s["total"] = s["cw1"] + s["cw2"] + s["cw3"] + s["exam"]
-
-       
-        if not students:
-             messagebox.showwarning("Warning", "No valid student data to analyze!")
-             return
-
-        
-        student = max(students, key=lambda x: x["total"]) if mode == "highest" else min(students, key=lambda x: x["total"])
+        student = found[0]
 
         messagebox.showinfo(
             f"{mode.capitalize()} Score Result",
             f"STUDENT WITH {mode.upper()} TOTAL SCORE:\n\n"
-            f"Code: {student['code']}\n"
-            f"Name: {student['name']}\n"
-            f"CW1: {student['cw1']}, CW2: {student['cw2']}, CW3: {student['cw3']}, Exam: {student['exam']}\n"
-            f"TOTAL: {student['total']}"
+            f"Code: {student.code}\n"
+            f"Name: {student.name}\n"
+            f"CW1: {student.cw1}, CW2: {student.cw2}, CW3: {student.cw3}, Exam: {student.exam}\n"
+            f"TOTAL: {student.total}"
         )
 
 
@@ -195,6 +567,9 @@ class MenuPage(ttk.Frame):
             ("Add New Student Record", "add"),
             ("Delete Student Record", "delete"),
             ("Update Existing Student Record", "update"),
+            ("Bulk Import Records (CSV)", controller.bulk_import),
+            ("Export Compressed Snapshot", controller.export_snapshot),
+            ("Restore Compressed Snapshot", controller.restore_snapshot),
         ]):
             data_frame.columnconfigure(0, weight=1)
             if isinstance(action, str):
@@ -203,13 +578,27 @@ class MenuPage(ttk.Frame):
                            command=lambda a=action: controller.show_frame("DataModificationFrame", action=a)
                            ).pack(fill="x", pady=8, ipady=5)
             else:
-                # Sort button 
+                # Sort and import buttons
                  ttk.Button(data_frame, text=text, style="Primary.TButton", command=action).pack(fill="x", pady=8, ipady=5)
 
 
+        # REPORTS
+        report_frame = ttk.LabelFrame(self, text="REPORTS", padding=15)
+        report_frame.grid(row=2, column=0, columnspan=2, sticky="nsew", padx=10, pady=10)
+
+        for idx, (text, func) in enumerate([
+            ("Top / Bottom N Students", lambda: controller.show_frame("RankingFrame")),
+            ("Cohort Statistics", lambda: controller.show_frame("StatisticsFrame")),
+            ("Mark Distribution Charts", lambda: controller.show_frame("ChartsFrame")),
+            ("Module Cohorts", lambda: controller.show_frame("CohortsFrame")),
+        ]):
+            report_frame.columnconfigure(idx, weight=1)
+            ttk.Button(report_frame, text=text, style="Primary.TButton", command=func).grid(
+                row=0, column=idx, sticky="ew", padx=5, ipady=5)
+
         # BACK button
         ttk.Button(self, text="← BACK TO COVER", style="Primary.TButton",
-                   command=lambda: controller.show_frame("CoverPage")).grid(row=2, columnspan=2, sticky="ew", pady=20)
+                   command=lambda: controller.show_frame("CoverPage")).grid(row=3, columnspan=2, sticky="ew", pady=20)
 
 
 
@@ -221,10 +610,24 @@ class ViewAllFrame(ttk.Frame):
         self.controller = controller
         
         self.columnconfigure(0, weight=1)
-        self.rowconfigure(1, weight=1)
+        self.rowconfigure(2, weight=1)
 
         ttk.Label(self, text="ALL STUDENT RECORDS", style="Title.TLabel").grid(row=0, column=0, pady=10)
 
+        # Filter bar, e.g. "exam < 40 and total > 100" or "any cw < 5"
+        filter_bar = ttk.Frame(self)
+        filter_bar.grid(row=1, column=0, columnspan=2, sticky="ew")
+        filter_bar.columnconfigure(1, weight=1)
+        ttk.Label(filter_bar, text="Filter:", font=("Helvetica", 12)).grid(row=0, column=0, padx=(0, 8))
+        self.filter_entry = ttk.Entry(filter_bar, font=("Helvetica", 12))
+        self.filter_entry.grid(row=0, column=1, sticky="ew")
+        self.filter_entry.bind("<Return>", lambda e: self.apply_filter())
+        ttk.Button(filter_bar, text="Apply", command=self.apply_filter).grid(row=0, column=2, padx=(8, 0))
+        ttk.Button(filter_bar, text="Clear", command=self.clear_filter).grid(row=0, column=3, padx=(8, 0))
+        self.count_label = ttk.Label(filter_bar, font=("Helvetica", 11))
+        self.count_label.grid(row=0, column=4, padx=(12, 0))
+        ttk.Button(filter_bar, text="Export...", command=self.export_view).grid(row=0, column=5, padx=(12, 0))
+
         # Treeview Setup
         columns = ("code", "name", "cw1", "cw2", "cw3", "exam", "total")
         self.tree = ttk.Treeview(self, columns=columns, show="headings")
@@ -246,40 +649,267 @@ class ViewAllFrame(ttk.Frame):
         self.tree.column("exam", width=80, anchor="center")
         self.tree.column("total", width=80, anchor="center")
 
-        self.tree.grid(row=1, column=0, sticky="nsew", pady=10)
+        self.tree.grid(row=2, column=0, sticky="nsew", pady=10)
 
-        # Add scrollbars
-        vsb = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
-        vsb.grid(row=1, column=1, sticky="ns")
-        self.tree.configure(yscrollcommand=vsb.set)
+        # Add scrollbars. In virtual mode the vertical one tracks the whole
+        # dataset rather than the handful of rows held by the Treeview.
+        self.vsb = ttk.Scrollbar(self, orient="vertical", command=self.on_yview)
+        self.vsb.grid(row=2, column=1, sticky="ns")
+        self.tree.configure(yscrollcommand=self.on_tree_scrolled)
 
         hsb = ttk.Scrollbar(self, orient="horizontal", command=self.tree.xview)
-        hsb.grid(row=2, column=0, sticky="ew")
+        hsb.grid(row=3, column=0, sticky="ew")
         self.tree.configure(xscrollcommand=hsb.set)
 
         ttk.Button(self, text="← BACK TO MENU", style="Primary.TButton",
-                   command=lambda: controller.show_frame("MenuPage")).grid(row=3, column=0, sticky="ew", pady=10)
+                   command=lambda: controller.show_frame("MenuPage")).grid(row=4, column=0, sticky="ew", pady=10)
 
+        # Rows in display order, and the first one shown when virtual
+        self.rows = []
+        self.offset = 0
+        self.virtual = False
+
+        # Treeview item of each student (keyed by code) when not virtual.
+        # Store edits are applied to the table as they happen, so it only
+        # needs rebuilding after a reload from disk or a change of sorting.
+        self.items = {}
+        self.sort_by_name = False
+        self.stale = True
+        self.fill_job = None
+        # Parsed filter expression, or None to show every record
+        self.filter_tree = None
+        self.filter_text = ""
+        controller.subscribe(self.on_store_change)
+
+        self.tree.bind("<Configure>", lambda e: self.render_window())
+        self.tree.bind("<MouseWheel>", lambda e: self.on_wheel(-1 if e.delta > 0 else 1))
+        self.tree.bind("<Button-4>", lambda e: self.on_wheel(-1))
+        self.tree.bind("<Button-5>", lambda e: self.on_wheel(1))
+
+    @staticmethod
+    def row_values(s):
+        return s.fields() + (s.total,)
+
+    @instrumented
     def refresh(self, sort_by_name=False):
         """Loads and displays student data in the Treeview, with optional sorting."""
-        # Clear existing data
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        if not self.controller.store_ready(lambda: self.refresh(sort_by_name)):
+            return
+        if not self.stale and sort_by_name == self.sort_by_name:
+            # Already up to date; keeping the items keeps the scroll position
+            return
 
-        students = load_students()
-        
-        # Calculate total and prepare data
-        for s in students:
-            s["total"] = s["cw1"] + s["cw2"] + s["cw3"] + s["exam"]
+        self.sort_by_name = sort_by_name
+        self.stale = False
+        store = self.controller.store
+        if self.filter_tree is None:
+            self.show_rows(store.sorted_by_name() if sort_by_name else store.all())
+            return
+
+        # Filtering runs on the worker; only the matching rows come back
+        tree = self.filter_tree
+
+        def job(cancel, progress):
+            return self.view_rows(tree, sort_by_name)
 
+        def done(students):
+            # Skip results overtaken by a new filter. If the store changed
+            # while filtering, run the same filter again on the new data.
+            if tree is not self.filter_tree:
+                return
+            if self.stale:
+                self.refresh(self.sort_by_name)
+            else:
+                self.show_rows(students)
+
+        self.controller.run_in_background(job, done, message="Filtering student records...")
+
+    def view_rows(self, tree, sort_by_name):
+        """Returns the records matching a parsed filter (or all of them) in display order."""
+        store = self.controller.store
+        if tree is None:
+            return store.sorted_by_name() if sort_by_name else store.all()
+        students = store.filter(tree)
         if sort_by_name:
-            students.sort(key=lambda s: s["name"].lower())
+            students.sort(key=name_sort_key)
+        return students
+
+    def export_view(self):
+        """Streams the records in the current view, sorted and filtered, to a CSV or HTML report."""
+        path = filedialog.asksaveasfilename(
+            title="Export Student Records", defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("HTML reports", "*.html"), ("All files", "*.*")],
+        )
+        if not path:
+            return
+        # The rows are gathered again on the worker, so the report matches
+        # the store even if the table is still catching up with it
+        tree, sort_by_name = self.filter_tree, self.sort_by_name
+        title = "Student Records"
+        if tree is not None:
+            title += f" where {self.filter_text}"
+        if sort_by_name:
+            title += ", sorted by name"
+
+        def job(cancel, progress):
+            self.controller.store.refresh(cancel)
+            return export_report(self.view_rows(tree, sort_by_name), path, title, cancel, progress)
+
+        def done(count):
+            messagebox.showinfo("Export", f"Exported {count} record(s) to:\n{path}")
+
+        self.controller.run_in_background(job, done, message=f"Exporting {os.path.basename(path)}...")
+
+    def show_rows(self, students):
+        """Replaces the table contents with the given records, in order."""
+        # Clear existing data
+        if self.fill_job is not None:
+            self.after_cancel(self.fill_job)
+            self.fill_job = None
+        self.tree.delete(*self.tree.get_children())
+        self.items = {}
+
+        self.rows = students
+        self.offset = 0
+        self.virtual = len(students) > VIRTUAL_ROW_THRESHOLD
+        self.show_count()
+
+        if self.virtual:
+            self.render_window()
+            return
 
         # Insert new data
-        for s in students:
-            self.tree.insert("", tk.END, values=(
-                s["code"], s["name"], s["cw1"], s["cw2"], s["cw3"], s["exam"], s["total"]
-            ))
+        self.fill_rows(0)
+
+    def show_count(self):
+        total = len(self.controller.store)
+        if self.filter_tree is None:
+            self.count_label.config(text=f"{total:,} students")
+        else:
+            self.count_label.config(text=f"{len(self.rows):,} of {total:,} students")
+
+    def apply_filter(self):
+        """Parses the filter bar and shows only the matching records."""
+        text = self.filter_entry.get().strip()
+        if not text:
+            self.clear_filter()
+            return
+        try:
+            tree = parse_filter(text)
+        except FilterError as e:
+            messagebox.showwarning("Filter", str(e))
+            return
+        self.filter_tree = tree
+        self.filter_text = text
+        self.stale = True
+        self.refresh(self.sort_by_name)
+
+    def clear_filter(self):
+        self.filter_entry.delete(0, tk.END)
+        if self.filter_tree is not None:
+            self.filter_tree = None
+            self.stale = True
+            self.refresh(self.sort_by_name)
+
+    def fill_rows(self, start):
+        """Inserts the next batch of rows, leaving the rest for the next event-loop turn."""
+        stop = min(start + FILL_BATCH_ROWS, len(self.rows))
+        for s in self.rows[start:stop]:
+            self.items[student_key(s.code)] = self.tree.insert("", tk.END, values=self.row_values(s))
+        self.fill_job = self.after(1, self.fill_rows, stop) if stop < len(self.rows) else None
+
+    def insert_position(self, s):
+        """Returns where a record belongs in the current display order."""
+        if not self.sort_by_name:
+            return len(self.rows)
+        return bisect_right(self.rows, name_sort_key(s), key=name_sort_key)
+
+    def on_store_change(self, action, s, old):
+        """Applies a single store change to the table instead of rebuilding it."""
+        if self.stale:
+            return
+        if action == "reload" or self.fill_job is not None or self.filter_tree is not None:
+            # Rebuilt on the next refresh; a change can move a record into
+            # or out of the filter, so filtered views are re-run
+            self.stale = True
+            return
+
+        key = student_key(s.code)
+        if action == "add":
+            position = self.insert_position(s)
+            self.rows.insert(position, s)
+        elif action == "delete":
+            self.rows.remove(s)
+        elif self.sort_by_name and s.name != old.name:
+            # A renamed student may belong somewhere else in the sorted order
+            self.rows.remove(s)
+            position = self.insert_position(s)
+            self.rows.insert(position, s)
+            if not self.virtual:
+                self.tree.move(self.items[key], "", position)
+
+        self.show_count()
+        if self.virtual:
+            self.render_window()
+        elif action == "add":
+            self.items[key] = self.tree.insert("", position, values=self.row_values(s))
+        elif action == "update":
+            self.tree.item(self.items[key], values=self.row_values(s))
+        else:
+            self.tree.delete(self.items.pop(key))
+
+    def page_size(self):
+        """Returns how many rows fit in the visible part of the Treeview."""
+        # One row's worth of height goes to the column headings
+        return max(1, self.tree.winfo_height() // TREE_ROW_HEIGHT - 1)
+
+    def render_window(self):
+        """Fills the Treeview with just the rows in the current viewport (virtual mode)."""
+        if not self.virtual:
+            return
+        total = len(self.rows)
+        page = self.page_size()
+        self.offset = max(0, min(self.offset, total - page))
+        window = self.rows[self.offset:self.offset + page]
+
+        # Reuse the existing items, only adding or dropping the difference
+        items = self.tree.get_children()
+        if len(items) > len(window):
+            self.tree.delete(*items[len(window):])
+        for _ in range(len(window) - len(items)):
+            self.tree.insert("", tk.END)
+
+        for item, s in zip(self.tree.get_children(), window):
+            self.tree.item(item, values=self.row_values(s))
+
+        if total:
+            self.vsb.set(self.offset / total, (self.offset + len(window)) / total)
+        else:
+            self.vsb.set(0, 1)
+
+    def on_yview(self, *args):
+        """Scrollbar callback: moves the viewport over the full dataset in virtual mode."""
+        if not self.virtual:
+            self.tree.yview(*args)
+            return
+        if args[0] == "moveto":
+            self.offset = int(float(args[1]) * len(self.rows))
+        elif args[0] == "scroll":
+            step = self.page_size() if args[2] == "pages" else 1
+            self.offset += int(args[1]) * step
+        self.render_window()
+
+    def on_tree_scrolled(self, first, last):
+        # In virtual mode the Treeview only knows about one page, so ignore it
+        if not self.virtual:
+            self.vsb.set(first, last)
+
+    def on_wheel(self, direction):
+        if not self.virtual:
+            return None
+        self.offset += direction * 3
+        self.render_window()
+        return "break"
 
 
 
@@ -288,6 +918,7 @@ class ViewAllFrame(ttk.Frame):
 class IndividualViewFrame(ttk.Frame):
     def __init__(self, parent, controller):
         super().__init__(parent, padding=40)
+        self.controller = controller
         self.columnconfigure(0, weight=1)
         self.rowconfigure(3, weight=1) #  result frame to expand
 
@@ -297,13 +928,22 @@ class IndividualViewFrame(ttk.Frame):
         input_frame.grid(row=1, column=0, sticky="ew", pady=10)
         input_frame.columnconfigure(1, weight=1)
         
-        ttk.Label(input_frame, text="Student Code:").grid(row=0, column=0, padx=5)
+        ttk.Label(input_frame, text="Student Code or Name:").grid(row=0, column=0, padx=5)
         self.code_entry = ttk.Entry(input_frame)
         self.code_entry.grid(row=0, column=1, sticky="ew", padx=5)
+        self.code_entry.bind("<KeyRelease>", lambda e: self.schedule_suggestions())
+        self.code_entry.bind("<Return>", lambda e: self.search_student())
 
         ttk.Button(input_frame, text="SEARCH", style="Primary.TButton",
                    command=self.search_student).grid(row=0, column=2, padx=5)
 
+        # Name matches for what has been typed so far
+        self.suggestions = tk.Listbox(self, height=5, font=("Consolas", 11), activestyle="none")
+        self.suggestions.grid(row=2, column=0, sticky="ew")
+        self.suggestions.bind("<<ListboxSelect>>", lambda e: self.pick_suggestion())
+        self.suggested = []
+        self.suggest_job = None
+
         result_frame = ttk.Frame(self)
         result_frame.grid(row=3, column=0, sticky="nsew", pady=10)
         
@@ -318,49 +958,113 @@ class IndividualViewFrame(ttk.Frame):
         ttk.Button(self, text="← BACK", style="Primary.TButton",
                    command=lambda: controller.show_frame("MenuPage")).grid(row=4, column=0, sticky="ew", pady=10)
 
+    @instrumented
     def refresh(self):
         """Clears the fields when returning to this page."""
         self.code_entry.delete(0, tk.END)
+        self.update_suggestions()
         self.result.config(state=tk.NORMAL)
         self.result.delete("1.0", tk.END)
         self.result.config(state=tk.DISABLED)
 
+    def schedule_suggestions(self):
+        """Updates the suggestions once typing pauses, rather than on every key."""
+        if self.suggest_job is not None:
+            self.after_cancel(self.suggest_job)
+        self.suggest_job = self.after(SUGGESTION_DELAY_MS, self.update_suggestions)
+
+    def update_suggestions(self):
+        """Lists students whose names start with, or else look like, the text typed so far."""
+        self.suggest_job = None
+        if not self.controller.store_ready(self.update_suggestions):
+            return
+        store = self.controller.store
+        text = self.code_entry.get()
+        suggested = store.names.prefix(text, limit=SUGGESTION_LIMIT)
+        if suggested or len(text.strip()) < FUZZY_MIN_CHARS:
+            self.show_suggestions(suggested)
+            return
+
+        # Fuzzy matching (and building its index the first time) runs on the worker
+        def job(cancel, progress):
+            return [s for _, s in store.fuzzy_search(text, SUGGESTION_LIMIT)]
+
+        def done(students):
+            # Skip results for text that has been typed over since
+            if self.code_entry.get() == text:
+                self.show_suggestions(students)
+
+        self.controller.run_in_background(job, done, message=None)
+
+    def show_suggestions(self, students):
+        self.suggested = students
+        self.suggestions.delete(0, tk.END)
+        for s in students:
+            self.suggestions.insert(tk.END, f"{s.name}  ({s.code})")
+
+    def pick_suggestion(self):
+        """Shows the record of the suggestion clicked in the list."""
+        selection = self.suggestions.curselection()
+        if not selection:
+            return
+        s = self.suggested[selection[0]]
+        self.code_entry.delete(0, tk.END)
+        self.code_entry.insert(0, s.code)
+        self.search_student()
+
+    @instrumented
     def search_student(self):
+        if not self.controller.store_ready(self.search_student):
+            return
         code = self.code_entry.get().strip()
         self.result.config(state=tk.NORMAL)
         self.result.delete("1.0", tk.END)
 
         if not code:
-            self.result.insert(tk.END, "Please enter a student code to search.")
+            self.result.insert(tk.END, "Please enter a student code or name to search.")
             self.result.config(state=tk.DISABLED)
             return
 
-        students = load_students()
-        
-        found_student = None
-        for s in students:
-            if s["code"].lower() == code.lower(): 
-                found_student = s
-                break
+        store = self.controller.store
+        found_student = store.get(code)
+        if found_student is None:
+            # Not a code, so fall back to a unique name match
+            matches = store.names.prefix(code, limit=2)
+            if not matches:
+                # Nor the start of a name; perhaps a misspelt one
+                candidates = store.fuzzy_search(code, SUGGESTION_LIMIT)
+                if len(candidates) == 1:
+                    matches = [candidates[0][1]]
+                elif candidates:
+                    self.show_suggestions([s for _, s in candidates])
+                    self.result.insert(tk.END, f"No exact match for '{code}'. Did you mean one of the students listed above?")
+                    self.result.config(state=tk.DISABLED)
+                    return
+            if len(matches) == 1:
+                found_student = matches[0]
+            elif matches:
+                self.result.insert(tk.END, f"Several students match '{code}'; pick one from the list above.")
+                self.result.config(state=tk.DISABLED)
+                return
         
         if found_student:
             s = found_student
-            total = s["cw1"] + s["cw2"] + s["cw3"] + s["exam"]
+            total = s.total
             
             output = (
                 f"--- Student Record ---\n\n"
-                f"Code: {s['code']}\n"
-                f"Name: {s['name']}\n\n"
-                f"CW1 ({MAX_CW}): {s['cw1']}\n"
-                f"CW2 ({MAX_CW}): {s['cw2']}\n"
-                f"CW3 ({MAX_CW}): {s['cw3']}\n"
-                f"Exam ({MAX_EXAM}): {s['exam']}\n\n"
+                f"Code: {s.code}\n"
+                f"Name: {s.name}\n\n"
+                f"CW1 ({MAX_CW}): {s.cw1}\n"
+                f"CW2 ({MAX_CW}): {s.cw2}\n"
+                f"CW3 ({MAX_CW}): {s.cw3}\n"
+                f"Exam ({MAX_EXAM}): {s.exam}\n\n"
                 f"Total Score: {total} / {3 * MAX_CW + MAX_EXAM}"
             )
             self.result.insert(tk.END, output)
         else:
-            messagebox.showwarning("Not found", f"Student code '{code}' not found in records.")
-            self.result.insert(tk.END, f"Student code '{code}' not found.")
+            messagebox.showwarning("Not found", f"No student matching '{code}' found in records.")
+            self.result.insert(tk.END, f"No student matching '{code}' found.")
 
         self.result.config(state=tk.DISABLED)
 
@@ -373,6 +1077,8 @@ class DataModificationFrame(ttk.Frame):
         super().__init__(parent, padding=40)
         self.controller = controller
         self.action = None
+        # (record, version) the update form was filled from
+        self.expected = None
 
         self.columnconfigure(0, weight=1)
 
@@ -399,15 +1105,19 @@ class DataModificationFrame(ttk.Frame):
             entry = ttk.Entry(input_frame)
             entry.grid(row=i, column=1, sticky="ew", pady=5, padx=5)
             self.entries[field] = entry
+        self.entries["code"].bind("<Return>", lambda e: self.load_for_update())
+        self.entries["code"].bind("<FocusOut>", lambda e: self.load_for_update())
 
         ttk.Button(self, text="CONFIRM ACTION", style="Primary.TButton",
                    command=self.perform_action).grid(row=2, column=0, sticky="ew", pady=10)
         ttk.Button(self, text="← BACK TO MENU", style="Primary.TButton",
                    command=lambda: controller.show_frame("MenuPage")).grid(row=3, column=0, sticky="ew", pady=5)
 
+    @instrumented
     def refresh(self, action):
         """Sets up the frame for the specific action (add, delete, update)."""
         self.action = action
+        self.expected = None
         self.title_label.config(text=f"{action.upper()} STUDENT RECORD")
         
         # Clear all 
@@ -424,17 +1134,38 @@ class DataModificationFrame(ttk.Frame):
         self.entries["exam"].config(state=tk.NORMAL if is_add_or_update else tk.DISABLED)
         
         self.entries["code"].config(state=tk.NORMAL) 
-    def perform_action(self):
+
+    def load_for_update(self):
+        """Fills the update form with the record for the entered code."""
+        if self.action != "update" or self.controller.store.is_stale():
+            return
         code = self.entries["code"].get().strip()
-        students = load_students()
+        if self.expected is not None and student_key(self.expected[0].code) == student_key(code):
+            return
+        self.fill_form(self.controller.store.read_for_edit(code))
 
-        if not code:
-            messagebox.showwarning("Input Error", "Student code cannot be empty.")
+    def fill_form(self, expected):
+        self.expected = expected
+        if expected is None:
+            return
+        record = expected[0]
+        for field in ("name",) + MARK_COLUMNS:
+            self.entries[field].delete(0, tk.END)
+            self.entries[field].insert(0, str(getattr(record, field)))
+
+    @instrumented
+    def perform_action(self):
+        if not self.controller.store_ready(self.perform_action):
+            return
+        store = self.controller.store
+        valid, code = validate_field("code", self.entries["code"].get())
+        if not valid:
+            messagebox.showwarning("Input Error", code)
             return
 
        
         if self.action == "add":
-            if any(s["code"].lower() == code.lower() for s in students):
+            if code in store:
                 messagebox.showerror("Error", f"Student code '{code}' already exists. Use 'Update' instead.")
                 return
 
@@ -447,28 +1178,22 @@ class DataModificationFrame(ttk.Frame):
                 return
             
             cw1, cw2, cw3, exam = result
+            valid, name = validate_field("name", self.entries["name"].get())
+            if not valid:
+                messagebox.showerror("Input Error", name)
+                return
             
-            new_s = {
-                "code": code,
-                "name": self.entries["name"].get().strip(),
-                "cw1": cw1,
-                "cw2": cw2,
-                "cw3": cw3,
-                "exam": exam,
-            }
-            students.append(new_s)
-            save_students(students)
+            new_s = Student(code, name, cw1, cw2, cw3, exam)
+            if not store.add(new_s):
+                messagebox.showerror("Error", f"Student code '{code}' was just added by someone else.")
+                return
             messagebox.showinfo("Success", f"Student '{code}' added successfully!")
             self.controller.show_frame("MenuPage")
 
 
         #  DELETE ACTION 
         elif self.action == "delete":
-            initial_count = len(students)
-            students = [s for s in students if s["code"].lower() != code.lower()]
-            
-            if len(students) < initial_count:
-                save_students(students)
+            if store.delete(code) is not None:
                 messagebox.showinfo("Success", f"Student '{code}' deleted successfully!")
                 self.controller.show_frame("MenuPage")
             else:
@@ -486,21 +1211,25 @@ class DataModificationFrame(ttk.Frame):
                 return
             
             cw1, cw2, cw3, exam = result
+            valid, name = validate_field("name", self.entries["name"].get())
+            if not valid:
+                messagebox.showerror("Input Error", name)
+                return
 
-            # 2.  update the record
-            found = False
-            for s in students:
-                if s["code"].lower() == code.lower():
-                    s["name"] = self.entries["name"].get().strip()
-                    s["cw1"] = cw1
-                    s["cw2"] = cw2
-                    s["cw3"] = cw3
-                    s["exam"] = exam
-                    found = True
-                    break
+            # 2.  update the record, merging with anyone else's edits since it was loaded
+            expected = self.expected
+            if expected is not None and student_key(expected[0].code) != student_key(code):
+                expected = None
+            try:
+                found = store.update(
+                    code, expected, name=name, cw1=cw1, cw2=cw2, cw3=cw3, exam=exam
+                )
+            except ConflictError as e:
+                messagebox.showerror("Edit Conflict", f"{e}\nThe form now shows the current values.")
+                self.fill_form(store.read_for_edit(code))
+                return
             
             if found:
-                save_students(students)
                 messagebox.showinfo("Success", f"Record for '{code}' updated successfully!")
                 self.controller.show_frame("MenuPage")
             else:
@@ -513,5 +1242,530 @@ class DataModificationFrame(ttk.Frame):
 
 
 
+#   TOP / BOTTOM N
+
+class RankingFrame(ttk.Frame):
+    def __init__(self, parent, controller):
+        super().__init__(parent, padding=20)
+        self.controller = controller
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(2, weight=1)
+
+        ttk.Label(self, text="TOP / BOTTOM STUDENTS", style="Title.TLabel").grid(row=0, column=0, pady=10)
+
+        input_frame = ttk.Frame(self)
+        input_frame.grid(row=1, column=0, sticky="ew", pady=10)
+
+        self.mode = tk.StringVar(value="Top")
+        ttk.Combobox(input_frame, textvariable=self.mode, values=("Top", "Bottom"),
+                     state="readonly", width=8).grid(row=0, column=0, padx=5)
+        self.count = tk.StringVar(value="10")
+        ttk.Spinbox(input_frame, from_=1, to=1000, textvariable=self.count, width=6).grid(row=0, column=1, padx=5)
+        ttk.Label(input_frame, text="students by total score").grid(row=0, column=2, padx=5)
+        ttk.Button(input_frame, text="SHOW", style="Primary.TButton",
+                   command=self.show_ranking).grid(row=0, column=3, padx=5)
+
+        columns = ("rank", "code", "name", "total", "percentile")
+        self.tree = ttk.Treeview(self, columns=columns, show="headings")
+        for col, text, width, anchor in (
+            ("rank", "Rank", 60, "center"),
+            ("code", "Code", 80, "center"),
+            ("name", "Name", 200, "w"),
+            ("total", f"Total (/{MAX_TOTAL})", 100, "center"),
+            ("percentile", "Percentile", 100, "center"),
+        ):
+            self.tree.heading(col, text=text)
+            self.tree.column(col, width=width, anchor=anchor)
+        self.tree.grid(row=2, column=0, sticky="nsew", pady=10)
+
+        vsb = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
+        vsb.grid(row=2, column=1, sticky="ns")
+        self.tree.configure(yscrollcommand=vsb.set)
+
+        ttk.Button(self, text="← BACK TO MENU", style="Primary.TButton",
+                   command=lambda: controller.show_frame("MenuPage")).grid(row=3, column=0, sticky="ew", pady=10)
+
+    @instrumented
+    def refresh(self):
+        """Shows the ranking for the current settings."""
+        self.show_ranking()
+
+    def show_ranking(self):
+        """Lists the top or bottom N students with their rank and percentile."""
+        try:
+            n = int(self.count.get())
+        except ValueError:
+            messagebox.showerror("Input Error", "The number of students must be an integer.")
+            return
+
+        if not self.controller.store_ready(self.show_ranking):
+            return
+        store = self.controller.store
+        students = store.top(n) if self.mode.get() == "Top" else store.bottom(n)
+
+        self.tree.delete(*self.tree.get_children())
+        for s in students:
+            self.tree.insert("", tk.END, values=(
+                store.ranking.rank(s), s.code, s.name, s.total,
+                f"{store.ranking.percentile(s):.1f}",
+            ))
+
+
+
+#   COHORT STATISTICS
+
+class StatisticsFrame(ttk.Frame):
+    def __init__(self, parent, controller):
+        super().__init__(parent, padding=20)
+        self.controller = controller
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+
+        ttk.Label(self, text="COHORT STATISTICS", style="Title.TLabel").grid(row=0, column=0, pady=10)
+
+        self.result = tk.Text(self, font=("Consolas", 12), wrap="none", relief="groove", borderwidth=2)
+        self.result.grid(row=1, column=0, sticky="nsew", pady=10)
+        self.result.config(state=tk.DISABLED)
+
+        ttk.Button(self, text="← BACK TO MENU", style="Primary.TButton",
+                   command=lambda: controller.show_frame("MenuPage")).grid(row=2, column=0, sticky="ew", pady=10)
+
+    @instrumented
+    def refresh(self):
+        """Recomputes the statistics for the current cohort in the background."""
+        if not self.controller.store_ready(self.refresh):
+            return
+        self.show_text("Computing statistics...")
+
+        def job(cancel, progress):
+            started = time.perf_counter()
+            stats = cohort_statistics(self.controller.store.columns())
+            return stats, time.perf_counter() - started
+
+        def done(result):
+            stats, elapsed = result
+            if stats is None:
+                self.show_text("No student data available!")
+            else:
+                self.show_text(self.format_statistics(stats, elapsed))
+
+        self.controller.run_in_background(job, done, message="Computing cohort statistics...")
+
+    def show_text(self, text):
+        self.result.config(state=tk.NORMAL)
+        self.result.delete("1.0", tk.END)
+        self.result.insert(tk.END, text)
+        self.result.config(state=tk.DISABLED)
+
+    @staticmethod
+    def format_statistics(stats, elapsed):
+        headings = ["Mean", "Median", "Std dev"] + [f"P{p}" for p in STAT_PERCENTILES]
+        lines = [f"Students: {stats['count']}", "", f"{'':<8}" + "".join(f"{h:>9}" for h in headings)]
+        for label, values in stats["summary"].items():
+            lines.append(f"{label:<8}" + "".join(f"{v:>9.2f}" for v in values))
+
+        lines += ["", "Grade distribution:"]
+        for grade, count in stats["grades"].items():
+            share = 100 * count / stats["count"]
+            lines.append(f"  {grade}: {count:>8}  ({share:5.1f}%)")
+
+        lines += ["", "Correlation with exam mark:"]
+        for label, r in stats["correlations"].items():
+            lines.append(f"  {label:<18} {r:>6.3f}")
+
+        engine = "NumPy" if load_numpy() is not None else "statistics module"
+        lines += ["", f"Computed in {elapsed * 1000:.1f} ms ({engine})."]
+        return "\n".join(lines)
+
+
+
+#   MARK DISTRIBUTION CHARTS
+
+class ChartsFrame(ttk.Frame):
+    """Histograms and a coursework-vs-exam density plot drawn on a Canvas.
+
+    The charts are drawn from a MarkDistribution, which counts students per
+    mark value, so the number of canvas items depends on the canvas size and
+    never on the number of students. Store edits adjust the counts in place,
+    and a reload recounts them in the background.
+    """
+
+    CHARTS = (("total", "Total score"), ("exam", "Exam mark"), ("cw", "Coursework total"),
+              ("scatter", "Coursework vs Exam"))
+    MARGIN_LEFT, MARGIN_RIGHT, MARGIN_TOP, MARGIN_BOTTOM = 60, 20, 30, 45
+
+    def __init__(self, parent, controller):
+        super().__init__(parent, padding=20)
+        self.controller = controller
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(2, weight=1)
+
+        ttk.Label(self, text="MARK DISTRIBUTION", style="Title.TLabel").grid(row=0, column=0, pady=10)
+
+        choices = ttk.Frame(self)
+        choices.grid(row=1, column=0)
+        self.chart = tk.StringVar(value="total")
+        for value, text in self.CHARTS:
+            ttk.Radiobutton(choices, text=text, value=value, variable=self.chart,
+                            command=self.redraw).pack(side="left", padx=10)
+
+        self.canvas = tk.Canvas(self, background="white", highlightthickness=0)
+        self.canvas.grid(row=2, column=0, sticky="nsew", pady=10)
+        self.canvas.bind("<Configure>", lambda e: self.schedule_redraw())
+
+        ttk.Button(self, text="← BACK TO MENU", style="Primary.TButton",
+                   command=lambda: controller.show_frame("MenuPage")).grid(row=3, column=0, sticky="ew", pady=10)
+
+        self.distribution = None
+        self.stale = True
+        # Set when the store changes while the counts are being rebuilt
+        self.building = False
+        self.outdated = False
+        self.redraw_job = None
+        controller.subscribe(self.on_store_change)
+
+    @instrumented
+    def refresh(self):
+        """Recounts the marks in the background if they need it, then draws."""
+        if not self.controller.store_ready(self.refresh):
+            return
+        if not self.stale:
+            self.redraw()
+            return
+        self.building, self.outdated = True, False
+
+        def job(cancel, progress):
+            return MarkDistribution(self.controller.store.columns())
+
+        def done(distribution):
+            self.building = False
+            self.distribution = distribution
+            self.stale = self.outdated
+            if self.stale:
+                self.refresh()
+            else:
+                self.redraw()
+
+        self.controller.run_in_background(job, done, message="Counting marks...")
+
+    def on_store_change(self, action, student, old):
+        if self.building:
+            self.outdated = True
+        elif self.stale:
+            # Recounted when next shown
+            return
+        elif self.distribution.apply(action, student, old):
+            self.schedule_redraw()
+        else:
+            # A reload; recount on the worker so the charts catch up by themselves
+            self.stale = True
+            self.refresh()
+
+    def schedule_redraw(self):
+        """Redraws once things settle, so a burst of resizes or edits costs one redraw."""
+        if self.redraw_job is not None:
+            self.after_cancel(self.redraw_job)
+        self.redraw_job = self.after(CHART_REDRAW_MS, self.redraw)
+
+    def redraw(self):
+        self.redraw_job = None
+        canvas = self.canvas
+        canvas.delete("all")
+        width, height = canvas.winfo_width(), canvas.winfo_height()
+        plot = (self.MARGIN_LEFT, self.MARGIN_TOP, width - self.MARGIN_RIGHT, height - self.MARGIN_BOTTOM)
+        if self.distribution is None or plot[2] <= plot[0] or plot[3] <= plot[1]:
+            return
+        if not self.distribution.count:
+            canvas.create_text(width / 2, height / 2, text="No student data available!", font=("Helvetica", 14))
+            return
+
+        chart = self.chart.get()
+        if chart == "scatter":
+            self.draw_density(plot)
+        else:
+            self.draw_histogram(plot, chart)
+        label = dict(self.CHARTS)[chart]
+        canvas.create_text(width / 2, 12, text=f"{label} — {self.distribution.count:,} students",
+                           font=("Helvetica", 12, "bold"))
+
+    def draw_histogram(self, plot, column):
+        left, top, right, bottom = plot
+        bins = self.distribution.bins(column, (right - left) // CHART_MIN_BAR_PX)
+        peak = max(n for _, _, n in bins) or 1
+        bar = (right - left) / len(bins)
+        for i, (first, last, n) in enumerate(bins):
+            x0 = left + i * bar
+            if n:
+                self.canvas.create_rectangle(x0 + 1, bottom - (bottom - top) * n / peak, x0 + bar - 1, bottom,
+                                             fill="#3498DB", outline="")
+        # Label about eight bins along the axis
+        step = max(1, len(bins) // 8)
+        for i in range(0, len(bins), step):
+            self.canvas.create_text(left + (i + 0.5) * bar, bottom + 12, text=str(bins[i][0]), font=("Helvetica", 9))
+        self.draw_axes(plot, dict(self.CHARTS)[column], f"{peak:,}")
+
+    def draw_density(self, plot):
+        left, top, right, bottom = plot
+        cells = self.distribution.cells((right - left) // CHART_MIN_CELL_PX, (bottom - top) // CHART_MIN_CELL_PX)
+        x_scale = (right - left) / (3 * MAX_CW + 1)
+        y_scale = (bottom - top) / (MAX_EXAM + 1)
+        peak = math.log1p(max(n for *_, n in cells))
+        for c0, c1, e0, e1, n in cells:
+            shade = math.log1p(n) / peak if peak else 1
+            self.canvas.create_rectangle(left + c0 * x_scale, bottom - (e1 + 1) * y_scale,
+                                         left + (c1 + 1) * x_scale, bottom - e0 * y_scale,
+                                         fill=self.density_colour(shade), outline="")
+        for cw in range(0, 3 * MAX_CW + 1, 10):
+            self.canvas.create_text(left + (cw + 0.5) * x_scale, bottom + 12, text=str(cw), font=("Helvetica", 9))
+        for exam in range(0, MAX_EXAM + 1, 20):
+            self.canvas.create_text(left - 8, bottom - (exam + 0.5) * y_scale, text=str(exam),
+                                    anchor="e", font=("Helvetica", 9))
+        self.draw_axes(plot, "Coursework total", "Exam")
+
+    @staticmethod
+    def density_colour(shade):
+        """Blends from light to dark blue as shade goes from 0 to 1."""
+        light, dark = (0xDC, 0xEB, 0xFA), (0x08, 0x30, 0x6B)
+        return "#" + "".join(f"{round(a + (b - a) * shade):02X}" for a, b in zip(light, dark))
+
+    def draw_axes(self, plot, x_label, y_label):
+        left, top, right, bottom = plot
+        self.canvas.create_line(left, top, left, bottom, right, bottom)
+        self.canvas.create_text((left + right) / 2, bottom + 32, text=x_label, font=("Helvetica", 10))
+        self.canvas.create_text(left - 8, top, text=y_label, anchor="e", font=("Helvetica", 10))
+
+
+
+#   MODULE COHORTS
+
+class CohortsFrame(ttk.Frame):
+    """Summaries and queries across a folder of marks files, one per module or year.
+
+    The files are loaded in parallel into a CohortSet, and each gets its own
+    store and indexes, separate from the store the other screens use. A
+    folder holding the main data file shows it as one more cohort. The "All
+    cohorts" row is combined from the per-file summaries rather than
+    recomputed.
+    """
+
+    QUERIES = ("Top", "Bottom", "Best average", "History of code")
+
+    def __init__(self, parent, controller):
+        super().__init__(parent, padding=20)
+        self.controller = controller
+        self.cohorts = None
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(2, weight=1)
+        self.rowconfigure(4, weight=2)
+
+        ttk.Label(self, text="MODULE COHORTS", style="Title.TLabel").grid(row=0, column=0, columnspan=2, pady=10)
+
+        folder_bar = ttk.Frame(self)
+        folder_bar.grid(row=1, column=0, columnspan=2, sticky="ew", pady=5)
+        folder_bar.columnconfigure(1, weight=1)
+        ttk.Button(folder_bar, text="Open Cohort Folder...", command=self.open_folder).grid(row=0, column=0, padx=5)
+        self.folder_label = ttk.Label(folder_bar, text="No folder opened.")
+        self.folder_label.grid(row=0, column=1, sticky="w", padx=5)
+
+        self.summary_tree = ttk.Treeview(self, columns=("cohort", "students", "mean", "std", "median", "best",
+                                                        "worst", "passed"), show="headings", height=6)
+        for col, text, width, anchor in (
+            ("cohort", "Cohort", 160, "w"),
+            ("students", "Students", 90, "center"),
+            ("mean", "Mean", 70, "center"),
+            ("std", "Std dev", 70, "center"),
+            ("median", "Median", 70, "center"),
+            ("best", "Best", 60, "center"),
+            ("worst", "Worst", 60, "center"),
+            ("passed", "Passed", 70, "center"),
+        ):
+            self.summary_tree.heading(col, text=text)
+            self.summary_tree.column(col, width=width, anchor=anchor)
+        self.summary_tree.grid(row=2, column=0, sticky="nsew", pady=5)
+        vsb = ttk.Scrollbar(self, orient="vertical", command=self.summary_tree.yview)
+        vsb.grid(row=2, column=1, sticky="ns")
+        self.summary_tree.configure(yscrollcommand=vsb.set)
+
+        query_bar = ttk.Frame(self)
+        query_bar.grid(row=3, column=0, columnspan=2, sticky="ew", pady=5)
+        self.query = tk.StringVar(value=self.QUERIES[0])
+        ttk.Combobox(query_bar, textvariable=self.query, values=self.QUERIES,
+                     state="readonly", width=16).grid(row=0, column=0, padx=5)
+        self.query_arg = tk.StringVar(value="10")
+        entry = ttk.Entry(query_bar, textvariable=self.query_arg, width=14)
+        entry.grid(row=0, column=1, padx=5)
+        entry.bind("<Return>", lambda e: self.run_query())
+        ttk.Button(query_bar, text="SHOW", style="Primary.TButton",
+                   command=self.run_query).grid(row=0, column=2, padx=5)
+
+        self.result_tree = ttk.Treeview(self, columns=("cohort", "code", "name", "total"), show="headings")
+        for col, text, width, anchor in (
+            ("cohort", "Cohort", 160, "w"),
+            ("code", "Code", 80, "center"),
+            ("name", "Name", 200, "w"),
+            ("total", f"Total (/{MAX_TOTAL})", 100, "center"),
+        ):
+            self.result_tree.heading(col, text=text)
+            self.result_tree.column(col, width=width, anchor=anchor)
+        self.result_tree.grid(row=4, column=0, sticky="nsew", pady=5)
+        vsb = ttk.Scrollbar(self, orient="vertical", command=self.result_tree.yview)
+        vsb.grid(row=4, column=1, sticky="ns")
+        self.result_tree.configure(yscrollcommand=vsb.set)
+
+        ttk.Button(self, text="← BACK TO MENU", style="Primary.TButton",
+                   command=lambda: controller.show_frame("MenuPage")).grid(row=5, column=0, columnspan=2,
+                                                                           sticky="ew", pady=10)
+
+    @instrumented
+    def refresh(self):
+        """Picks up changes made to the cohort files since they were loaded."""
+        if self.cohorts is None:
+            return
+        cohorts = self.cohorts
+
+        def job(cancel, progress):
+            cohorts.refresh()
+            # Recomputes the summaries of changed cohorts here, not in Tk
+            cohorts.merged_summary()
+
+        self.controller.run_in_background(job, lambda result: self.show_summaries(),
+                                          message="Checking cohort files...")
+
+    def open_folder(self):
+        directory = filedialog.askdirectory(title="Open Cohort Folder", mustexist=True)
+        if not directory:
+            return
+        cohorts = CohortSet(directory)
+        if not cohorts.paths:
+            messagebox.showwarning("Warning", f"No marks files in:\n{directory}")
+            return
+
+        def job(cancel, progress):
+            return cohorts.load(cancel=cancel, progress=progress)
+
+        def done(count):
+            self.cohorts = cohorts
+            self.folder_label.config(text=f"{directory}  ({count} cohorts, {len(cohorts)} students)")
+            self.show_summaries()
+            self.result_tree.delete(*self.result_tree.get_children())
+
+        self.controller.run_in_background(job, done,
+                                          message=f"Loading {len(cohorts.paths)} cohort files...")
+
+    def show_summaries(self):
+        self.summary_tree.delete(*self.summary_tree.get_children())
+        rows = [(label, self.cohorts.summary(label)) for label in self.cohorts.stores]
+        for label, summary in rows + [("All cohorts", self.cohorts.merged_summary())]:
+            if not summary.count:
+                self.summary_tree.insert("", tk.END, values=(label, 0, "-", "-", "-", "-", "-", "-"))
+                continue
+            failed = summary.grades()[GRADE_BANDS[-1][0]]
+            self.summary_tree.insert("", tk.END, values=(
+                label, summary.count, f"{summary.mean():.1f}", f"{summary.std():.1f}", summary.percentile(50),
+                summary.best[0][0], summary.worst[0][0], f"{100 * (summary.count - failed) / summary.count:.0f}%",
+            ))
+
+    def run_query(self):
+        if self.cohorts is None:
+            messagebox.showwarning("Warning", "Open a cohort folder first.")
+            return
+        query, arg = self.query.get(), self.query_arg.get().strip()
+        if query == "History of code":
+            rows = [(label, s.code, s.name, s.total) for label, s in self.cohorts.history(arg)]
+            if not rows:
+                messagebox.showinfo("Not Found", f"Student code '{arg}' is in no cohort.")
+        else:
+            try:
+                n = int(arg)
+            except ValueError:
+                messagebox.showerror("Input Error", "The number of students must be an integer.")
+                return
+            if query == "Best average":
+                rows = [(f"{count} cohort(s)", code, name, f"{average:.1f}")
+                        for average, code, name, count in self.cohorts.best_students(n)]
+            else:
+                ranked = self.cohorts.top(n) if query == "Top" else self.cohorts.bottom(n)
+                rows = [(label, s.code, s.name, s.total) for label, s in ranked]
+
+        self.result_tree.delete(*self.result_tree.get_children())
+        for values in rows:
+            self.result_tree.insert("", tk.END, values=values)
+
+
+
+#   DIAGNOSTICS
+
+class DiagnosticsFrame(ttk.Frame):
+    """Latency percentiles for the instrumented actions, with trace and profile export."""
+
+    def __init__(self, parent, controller):
+        super().__init__(parent, padding=20)
+        self.controller = controller
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+
+        ttk.Label(self, text="DIAGNOSTICS", style="Title.TLabel").grid(row=0, column=0, pady=10)
+
+        columns = ("action", "calls", "p50", "p95", "p99", "records", "read", "written")
+        self.tree = ttk.Treeview(self, columns=columns, show="headings")
+        for col, text, width, anchor in (
+            ("action", "Action", 240, "w"),
+            ("calls", "Calls", 60, "center"),
+            ("p50", "p50 (ms)", 80, "center"),
+            ("p95", "p95 (ms)", 80, "center"),
+            ("p99", "p99 (ms)", 80, "center"),
+            ("records", "Records", 80, "center"),
+            ("read", "Read (KB)", 80, "center"),
+            ("written", "Written (KB)", 90, "center"),
+        ):
+            self.tree.heading(col, text=text)
+            self.tree.column(col, width=width, anchor=anchor)
+        self.tree.grid(row=1, column=0, sticky="nsew", pady=10)
+
+        buttons = ttk.Frame(self)
+        buttons.grid(row=2, column=0, sticky="ew")
+        for i in range(3):
+            buttons.columnconfigure(i, weight=1)
+        ttk.Button(buttons, text="REFRESH", style="Primary.TButton",
+                   command=self.refresh).grid(row=0, column=0, sticky="ew", padx=5)
+        ttk.Button(buttons, text="EXPORT CHROME TRACE", style="Primary.TButton",
+                   command=self.export_trace).grid(row=0, column=1, sticky="ew", padx=5)
+        ttk.Button(buttons, text="SAVE PROFILE", style="Primary.TButton",
+                   command=self.save_profile).grid(row=0, column=2, sticky="ew", padx=5)
+
+        ttk.Button(self, text="← BACK TO MENU", style="Primary.TButton",
+                   command=lambda: controller.show_frame("MenuPage")).grid(row=3, column=0, sticky="ew", pady=10)
+
+    def refresh(self):
+        """Shows the figures for every action logged so far, slowest p95 first."""
+        self.tree.delete(*self.tree.get_children())
+        rows = sorted(action_log.summary().items(), key=lambda item: item[1][2], reverse=True)
+        for name, (calls, p50, p95, p99, records, read, written) in rows:
+            self.tree.insert("", tk.END, values=(
+                name, calls, f"{p50:.1f}", f"{p95:.1f}", f"{p99:.1f}", records,
+                f"{read / 1024:.1f}", f"{written / 1024:.1f}",
+            ))
+
+    def export_trace(self):
+        path = filedialog.asksaveasfilename(title="Export Chrome trace", defaultextension=".json",
+                                            filetypes=[("Trace files", "*.json")])
+        if path:
+            action_log.export_chrome_trace(path)
+            messagebox.showinfo("Diagnostics", f"Trace written to '{path}'.")
+
+    def save_profile(self):
+        path = filedialog.asksaveasfilename(title="Save cProfile dump", defaultextension=".prof",
+                                            filetypes=[("Profile dumps", "*.prof")])
+        if path:
+            action_log.dump_profile(path)
+            messagebox.showinfo("Diagnostics", f"Profile written to '{path}'.")
+
+
+
 if __name__ == "__main__":
     App().mainloop()
\ No newline at end of file
@@ -0,0 +1,321 @@
+"""Benchmarks for the Student Manager data layer on synthetic cohorts.
+
+    python student_bench.py generate 1M cohort.txt --corrupt 0.01
+    python student_bench.py run --sizes 1k 100k 1M --output bench.json
+    python student_bench.py run --sizes 100k --compare bench.json --gui
+
+Each run times loading, saving, archiving, lookups, edits, sorting,
+highest/lowest, chart counts and (with --gui) filling a Treeview, then writes throughput
+and peak memory per operation to a JSON file that later runs can be
+compared against.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from student_core import MAX_CW, MAX_EXAM, Student, StudentStore, MarkDistribution, write_archive, read_archive
+
+FIRST_NAMES = ("John", "Sam", "Lee", "Matt", "Ron", "Jake", "Jo", "Gareth", "Alan", "Les",
+               "Amira", "Chen", "Priya", "Olu", "Marta", "Kenji", "Zoe", "Ivan", "Nia", "Tomas")
+LAST_NAMES = ("Curry", "Sturtivant", "Scott", "Thompson", "Herrema", "Hobbs", "Hyde", "Southgate",
+              "Shearer", "Ferdinand", "Okafor", "Novak", "Silva", "Tanaka", "Kowalski", "Haddad")
+
+# Records are generated and written this many at a time
+GENERATE_BATCH = 100000
+
+# Single-record operations are repeated this many times per measurement
+DEFAULT_OPS = 200
+
+
+def parse_count(text):
+    """Parses a student count such as 5000, 10k or 2.5M."""
+    scale = {"k": 1000, "m": 1000000}.get(text[-1:].lower(), 1)
+    number = text[:-1] if scale != 1 else text
+    try:
+        return int(float(number) * scale)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a student count: {text!r}")
+
+def format_count(n):
+    for suffix, scale in (("M", 1000000), ("k", 1000)):
+        if n >= scale and n % scale == 0:
+            return f"{n // scale}{suffix}"
+    return str(n)
+
+def corrupt_line(rng, code):
+    """Returns a damaged line: one the loader has to skip, or one with marks off the scale.
+
+    The loader keeps the last kind, so the indexes and charts have to cope
+    with marks below zero or above MAX_CW and MAX_EXAM.
+    """
+    kind = rng.randrange(4)
+    if kind == 0:
+        return f"{code},Truncated Record,{rng.randint(0, MAX_CW)}\n"
+    if kind == 1:
+        return f"{code},Bad Marks,x,{rng.randint(0, MAX_CW)},{rng.randint(0, MAX_CW)},??\n"
+    if kind == 2:
+        return f"{code},Off Scale,{rng.randint(-5, -1)},{MAX_CW + 1},{rng.randint(0, MAX_CW)},{MAX_EXAM * 2}\n"
+    return f"{code};Wrong Separator;1;2;3;4\n"
+
+def generate_cohort(path, count, corrupt=0.0, seed=0):
+    """Writes a synthetic marks file with a count line and `count` student lines.
+
+    A `corrupt` fraction of the lines are damaged. Returns the file size.
+    """
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        f.write(f"{count}\n")
+        for start in range(0, count, GENERATE_BATCH):
+            lines = []
+            for i in range(start, min(start + GENERATE_BATCH, count)):
+                code = 100000 + i
+                if corrupt and rng.random() < corrupt:
+                    lines.append(corrupt_line(rng, code))
+                    continue
+                lines.append(f"{code},{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)},"
+                             f"{rng.randint(0, MAX_CW)},{rng.randint(0, MAX_CW)},"
+                             f"{rng.randint(0, MAX_CW)},{rng.randint(0, MAX_EXAM)}\n")
+            f.writelines(lines)
+    return os.path.getsize(path)
+
+
+
+#   BENCHMARKS
+
+def measure(func, items, repeat=1, memory=True):
+    """Times func() and returns its result details.
+
+    The fastest of `repeat` runs is kept. Peak memory comes from one extra
+    run under tracemalloc, which is kept out of the timings because it
+    slows Python code down several times.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    result = {
+        "seconds": best,
+        "items": items,
+        "items_per_second": items / best if best else None,
+    }
+    if memory:
+        tracemalloc.start()
+        try:
+            func()
+            result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+def populate_tree(students):
+    """Fills a Treeview with every record, as the View All screen does for small tables."""
+    import tkinter as tk
+    from tkinter import ttk
+
+    root = tk.Tk()
+    root.withdraw()
+    try:
+        tree = ttk.Treeview(root, columns=("code", "name", "cw1", "cw2", "cw3", "exam", "total"),
+                            show="headings")
+        for s in students:
+            tree.insert("", "end", values=s.fields() + (s.total,))
+        root.update_idletasks()
+    finally:
+        root.destroy()
+
+def bench_cohort(directory, count, corrupt, ops, repeat, memory, gui):
+    """Runs every benchmark on one generated cohort. Returns its report entry."""
+    path = os.path.join(directory, f"cohort-{count}.txt")
+    results = {}
+
+    start = time.perf_counter()
+    size = generate_cohort(path, count, corrupt)
+    results["generate"] = {"seconds": time.perf_counter() - start, "items": count, "bytes": size}
+
+    def load():
+        StudentStore(path).refresh()
+    results["load"] = measure(load, count, repeat, memory)
+    results["load"]["bytes"] = size
+
+    store = StudentStore(path)
+    store.refresh()
+    loaded = len(store)
+    rng = random.Random(1)
+    codes = [s.code for s in rng.sample(store.all(), min(ops, loaded))]
+    new_codes = [f"new{i}" for i in range(ops)]
+
+    archive = os.path.join(directory, f"cohort-{count}.smz")
+    def save_archive():
+        write_archive(store.all(), archive)
+    results["save_archive"] = measure(save_archive, loaded, repeat, memory)
+    results["save_archive"]["bytes"] = os.path.getsize(archive)
+
+    def load_archive():
+        read_archive(archive)
+    results["load_archive"] = measure(load_archive, loaded, repeat, memory)
+
+    def lookup():
+        for code in codes:
+            store.get(code)
+    results["lookup"] = measure(lookup, len(codes), repeat, memory)
+
+    def sort_by_name():
+        store.sorted_by_name()
+    results["sort_by_name"] = measure(sort_by_name, loaded, repeat, memory)
+
+    def highest_lowest():
+        for _ in range(ops):
+            store.top(1)
+            store.bottom(1)
+    results["highest_lowest"] = measure(highest_lowest, 2 * ops, repeat, memory)
+
+    def charts():
+        MarkDistribution(store.columns())
+    results["charts"] = measure(charts, loaded, repeat, memory)
+
+    if gui:
+        try:
+            students = store.all()
+            results["populate_table"] = measure(lambda: populate_tree(students), loaded, repeat, memory)
+        except Exception as e:
+            # No tkinter, or no display to open a window on
+            results["populate_table"] = {"skipped": str(e)}
+
+    # Edits change the file, so each is timed once, in an order that leaves
+    # the cohort as it started
+    def add():
+        for code in new_codes:
+            store.add(Student(code, "Bench Student", 1, 2, 3, 4))
+    results["add"] = measure(add, ops, memory=False)
+
+    def update():
+        for code in new_codes:
+            store.update(code, exam=5)
+    results["update"] = measure(update, ops, memory=False)
+
+    def delete():
+        for code in new_codes:
+            store.delete(code)
+    results["delete"] = measure(delete, ops, memory=False)
+
+    def save():
+        store.compact()
+    results["save"] = measure(save, loaded, repeat, memory)
+    results["save"]["bytes"] = os.path.getsize(path)
+
+    return {"students": count, "loaded": loaded, "corrupt_fraction": corrupt,
+            "file_bytes": size, "results": results}
+
+def source_version():
+    """Returns the git commit of the code being measured, if there is one."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(sizes, corrupt=0.0, ops=DEFAULT_OPS, repeat=1, memory=True, gui=False):
+    report = {
+        "version": source_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cohorts": {},
+    }
+    directory = tempfile.mkdtemp(prefix="student-bench-")
+    try:
+        for count in sizes:
+            print(f"Benchmarking {format_count(count)} students...", file=sys.stderr)
+            cohort = bench_cohort(directory, count, corrupt, ops, repeat, memory, gui)
+            report["cohorts"][format_count(count)] = cohort
+            print_cohort(format_count(count), cohort)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return report
+
+
+
+#   REPORTING
+
+def print_cohort(label, cohort):
+    print(f"\n{label} students ({cohort['loaded']} loaded, {cohort['file_bytes'] / 1e6:.1f} MB)")
+    print(f"  {'operation':<16}{'seconds':>12}{'items/s':>14}{'peak MB':>10}")
+    for name, r in cohort["results"].items():
+        if "skipped" in r:
+            print(f"  {name:<16}skipped: {r['skipped']}")
+            continue
+        rate = f"{r['items_per_second']:,.0f}" if r.get("items_per_second") else "-"
+        peak = f"{r['peak_bytes'] / 1e6:.1f}" if "peak_bytes" in r else "-"
+        print(f"  {name:<16}{r['seconds']:>12.4f}{rate:>14}{peak:>10}")
+
+def compare_reports(old, new):
+    """Prints how each operation's time changed since an earlier report."""
+    print(f"\nCompared with {old.get('version') or 'previous run'} ({old.get('timestamp')}):")
+    for label, cohort in new["cohorts"].items():
+        before = old.get("cohorts", {}).get(label)
+        if before is None:
+            continue
+        print(f"  {label} students")
+        for name, r in cohort["results"].items():
+            b = before["results"].get(name)
+            if not b or "seconds" not in b or "seconds" not in r or not b["seconds"]:
+                continue
+            ratio = r["seconds"] / b["seconds"]
+            verdict = "slower" if ratio > 1 else "faster"
+            print(f"    {name:<16}{ratio:>6.2f}x the time ({abs(ratio - 1) * 100:.0f}% {verdict})")
+
+
+
+#   ARGUMENTS
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="student_bench", description="Benchmark the Student Manager data layer.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("generate", help="write a synthetic marks file")
+    p.add_argument("count", type=parse_count)
+    p.add_argument("path")
+    p.add_argument("--corrupt", type=float, default=0.0, help="fraction of damaged lines")
+    p.add_argument("--seed", type=int, default=0)
+
+    p = commands.add_parser("run", help="run the benchmarks")
+    p.add_argument("--sizes", type=parse_count, nargs="+", default=[1000, 10000, 100000])
+    p.add_argument("--corrupt", type=float, default=0.01, help="fraction of damaged lines")
+    p.add_argument("--ops", type=int, default=DEFAULT_OPS, help="repetitions of single-record operations")
+    p.add_argument("--repeat", type=int, default=1, help="keep the fastest of this many runs")
+    p.add_argument("--no-memory", dest="memory", action="store_false", help="skip the tracemalloc runs")
+    p.add_argument("--gui", action="store_true", help="also time filling a Treeview")
+    p.add_argument("--output", default="bench.json", help="where to write the JSON results")
+    p.add_argument("--compare", help="an earlier JSON result to compare against")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "generate":
+        size = generate_cohort(args.path, args.count, args.corrupt, args.seed)
+        print(f"Wrote {args.count} students ({size / 1e6:.1f} MB) to {args.path}")
+        return 0
+
+    report = run_benchmarks(args.sizes, args.corrupt, args.ops, args.repeat, args.memory, args.gui)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare_reports(json.load(f), report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
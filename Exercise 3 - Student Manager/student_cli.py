@@ -0,0 +1,344 @@
+"""Command line for Student Manager data files. Never imports tkinter.
+
+    python student_cli.py list
+    python student_cli.py list --where "exam < 40 and total > 100"
+    python student_cli.py search Ali
+    python student_cli.py add 1234 "Ada Lovelace" 18 19 20 95
+    python student_cli.py update 1234 --exam 97
+    python student_cli.py delete 1234
+    python student_cli.py top 5
+    python student_cli.py sort --by total --reverse
+    python student_cli.py import new_students.csv
+    python student_cli.py export marks.csv
+    python student_cli.py export autumn.smz
+    python student_cli.py report failing.html --where "total < 64" --by name
+    python student_cli.py restore autumn.smz
+    python student_cli.py cohorts modules/ summary
+    python student_cli.py cohorts modules/ history 1234
+    python student_cli.py gui
+
+Records are printed as CSV with a total column. --file picks another data
+file; .db files are queried in SQL without loading every record. .smz
+files are compressed archives for copying and keeping cohorts.
+"""
+
+import argparse
+import csv
+import os
+import sys
+
+from student_core import (
+    DATA_FILE, MARK_COLUMNS, Student, StudentStore, SQLiteBackend, student_key, name_sort_key,
+    validate_field, validate_marks, open_backend, convert_marks_file, import_students, write_import_rejects,
+    restore_archive, FilterError, CohortSet, export_report,
+)
+
+OUTPUT_COLUMNS = Student.FIELDS + ("total",)
+# How many fuzzy name matches search prints without --limit
+FUZZY_LIMIT = 10
+GUI_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Student Manager.py")
+
+
+class CommandError(Exception):
+    """A command could not be carried out; the message is shown to the user."""
+
+
+def write_rows(students, out=None, header=True):
+    """Writes records as CSV rows, with their totals."""
+    writer = csv.writer(out or sys.stdout, lineterminator="\n")
+    if header:
+        writer.writerow(OUTPUT_COLUMNS)
+    for s in students:
+        writer.writerow(s.fields() + (s.total,))
+
+def open_store(args):
+    store = StudentStore(args.file)
+    try:
+        store.refresh()
+    except ValueError as e:
+        # A .smb or .smz file that is truncated or not one at all
+        raise CommandError(str(e))
+    return store
+
+def sql_backend(args):
+    """Returns the SQLite backend for the data file, or None for other formats."""
+    if not os.path.exists(args.file):
+        return None
+    backend = open_backend(args.file)
+    return backend if isinstance(backend, SQLiteBackend) else None
+
+def checked_marks(cw1, cw2, cw3, exam):
+    valid, result = validate_marks(cw1, cw2, cw3, exam)
+    if not valid:
+        raise CommandError(result)
+    return result
+
+def checked_field(field, value):
+    valid, result = validate_field(field, value)
+    if not valid:
+        raise CommandError(result)
+    return result
+
+
+
+#   COMMANDS
+
+def cmd_list(args):
+    store = open_store(args)
+    try:
+        students = store.filter(args.where) if args.where else store.all()
+    except FilterError as e:
+        raise CommandError(f"Bad filter: {e}")
+    write_rows(students, header=args.header)
+
+def cmd_search(args):
+    """Prints the record with the given code, or else the name prefix or fuzzy matches."""
+    backend = sql_backend(args)
+    store = None
+    if backend is not None:
+        found = backend.find(args.text)
+        matches = [found] if found else backend.name_prefix(args.text, -1 if args.limit is None else args.limit)
+    else:
+        store = open_store(args)
+        found = store.get(args.text)
+        matches = [found] if found else store.names.prefix(args.text, args.limit)
+    if not matches:
+        # Perhaps a misspelt name. SQLite has no trigram index, so a .db
+        # is loaded into a store for this.
+        if store is None:
+            store = open_store(args)
+        matches = [s for _, s in store.fuzzy_search(args.text, args.limit or FUZZY_LIMIT)]
+    if not matches:
+        raise CommandError(f"No student matches '{args.text}'.")
+    write_rows(matches, header=args.header)
+
+def cmd_add(args):
+    cw1, cw2, cw3, exam = checked_marks(args.cw1, args.cw2, args.cw3, args.exam)
+    student = Student(checked_field("code", args.code), checked_field("name", args.name), cw1, cw2, cw3, exam)
+    if not open_store(args).add(student):
+        raise CommandError(f"Student code '{student.code}' already exists. Use 'update' instead.")
+
+def cmd_update(args):
+    store = open_store(args)
+    current = store.get(args.code)
+    if current is None:
+        raise CommandError(f"Student code '{args.code}' not found.")
+    marks = [getattr(current, c) if getattr(args, c) is None else getattr(args, c) for c in MARK_COLUMNS]
+    fields = dict(zip(MARK_COLUMNS, checked_marks(*marks)))
+    if args.name is not None:
+        fields["name"] = checked_field("name", args.name)
+    store.update(args.code, **fields)
+
+def cmd_delete(args):
+    store = open_store(args)
+    missing = [code for code in args.codes if store.delete(code) is None]
+    if missing:
+        raise CommandError("Not found: " + ", ".join(missing))
+
+def cmd_top(args):
+    backend = sql_backend(args)
+    source = backend if backend is not None else open_store(args)
+    write_rows(source.top(args.n), header=args.header)
+
+def cmd_bottom(args):
+    backend = sql_backend(args)
+    source = backend if backend is not None else open_store(args)
+    write_rows(source.bottom(args.n), header=args.header)
+
+def cmd_sort(args):
+    backend = sql_backend(args)
+    if args.by == "name" and backend is not None and not args.reverse:
+        students = backend.sorted_by_name()
+    elif args.by == "name":
+        students = open_store(args).sorted_by_name()
+        if args.reverse:
+            students.reverse()
+    else:
+        key = (lambda s: s.total) if args.by == "total" else (lambda s: student_key(s.code))
+        students = sorted(open_store(args).all(), key=key, reverse=args.reverse)
+    write_rows(students, header=args.header)
+
+def cmd_import(args):
+    accepted, rejected = import_students(args.csv, open_store(args))
+    print(f"Imported {accepted} record(s).")
+    if rejected:
+        print(f"Rejected {len(rejected)} row(s); see {write_import_rejects(args.csv, rejected)}",
+              file=sys.stderr)
+        return 1
+    return 0
+
+def cmd_export(args):
+    """Writes every record to a .csv file, or converts to the format of the extension."""
+    if not args.dest.lower().endswith(".csv"):
+        convert_marks_file(args.file, args.dest)
+        return
+    with open(args.dest, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(Student.FIELDS)
+        for s in open_store(args).all():
+            writer.writerow(s.fields())
+
+def cmd_report(args):
+    """Writes a .csv or .html report with totals, percentages and grades."""
+    store = open_store(args)
+    try:
+        students = store.filter(args.where) if args.where else store.all()
+    except FilterError as e:
+        raise CommandError(f"Bad filter: {e}")
+    if args.by == "name":
+        students.sort(key=name_sort_key, reverse=args.reverse)
+    elif args.by is not None:
+        key = (lambda s: s.total) if args.by == "total" else (lambda s: student_key(s.code))
+        students.sort(key=key, reverse=args.reverse)
+    count = export_report(students, args.dest, args.title or "Student Records")
+    print(f"Wrote {count} record(s) to {args.dest}.")
+
+def cmd_restore(args):
+    """Replaces every record in the data file with those of a compressed archive."""
+    try:
+        count = restore_archive(args.archive, open_store(args))
+    except ValueError as e:
+        raise CommandError(str(e))
+    print(f"Restored {count} record(s) from {args.archive}.")
+
+def cmd_cohorts(args):
+    """Answers questions across every marks file in a directory."""
+    if not os.path.isdir(args.directory):
+        raise CommandError(f"Not a directory: {args.directory}")
+    cohorts = CohortSet(args.directory)
+    count = 1
+    if args.query in ("top", "bottom", "best") and args.arg:
+        try:
+            count = int(args.arg)
+        except ValueError:
+            raise CommandError(f"{args.query} needs a number, not '{args.arg}'.")
+    if not cohorts.load():
+        raise CommandError(f"No marks files in {args.directory}")
+    writer = csv.writer(sys.stdout, lineterminator="\n")
+    if args.query == "summary":
+        if args.header:
+            writer.writerow(("cohort", "students", "mean", "std", "median", "best", "worst"))
+        rows = [(label, cohorts.summary(label)) for label in cohorts.stores]
+        for label, summary in rows + [("all", cohorts.merged_summary())]:
+            writer.writerow((label, summary.count, f"{summary.mean():.2f}", f"{summary.std():.2f}",
+                             summary.percentile(50), summary.best[0][0] if summary.best else "",
+                             summary.worst[0][0] if summary.worst else ""))
+    elif args.query == "history":
+        if not args.arg:
+            raise CommandError("history needs a student code.")
+        history = cohorts.history(args.arg)
+        if not history:
+            raise CommandError(f"Student code '{args.arg}' is in no cohort.")
+        if args.header:
+            writer.writerow(("cohort",) + OUTPUT_COLUMNS)
+        for label, s in history:
+            writer.writerow((label,) + s.fields() + (s.total,))
+    elif args.query == "best":
+        if args.header:
+            writer.writerow(("code", "name", "average", "cohorts"))
+        for average, code, name, count in cohorts.best_students(count, args.min_cohorts):
+            writer.writerow((code, name, f"{average:.2f}", count))
+    else:
+        results = cohorts.top if args.query == "top" else cohorts.bottom
+        if args.header:
+            writer.writerow(("cohort",) + OUTPUT_COLUMNS)
+        for label, s in results(count):
+            writer.writerow((label,) + s.fields() + (s.total,))
+
+def cmd_gui(args):
+    # Only this command pays for starting Tk
+    import runpy
+    runpy.run_path(GUI_SCRIPT, run_name="__main__")
+
+
+
+#   ARGUMENTS
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="student_cli", description="Manage student marks from the command line.")
+    parser.add_argument("--file", default=DATA_FILE, help=f"data file (default: {DATA_FILE})")
+    parser.add_argument("--no-header", dest="header", action="store_false", help="omit the CSV header row")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("list", help="print all records in file order")
+    p.add_argument("--where", help='only records matching a filter, e.g. "any cw < 5"')
+    p.set_defaults(run=cmd_list)
+
+    p = commands.add_parser("search", help="find a record by code, or records by name prefix")
+    p.add_argument("text")
+    p.add_argument("--limit", type=int, default=None)
+    p.set_defaults(run=cmd_search)
+
+    p = commands.add_parser("add", help="add a new record")
+    for arg in ("code", "name") + MARK_COLUMNS:
+        p.add_argument(arg)
+    p.set_defaults(run=cmd_add)
+
+    p = commands.add_parser("update", help="change fields of a record")
+    p.add_argument("code")
+    p.add_argument("--name")
+    for column in MARK_COLUMNS:
+        p.add_argument("--" + column)
+    p.set_defaults(run=cmd_update)
+
+    p = commands.add_parser("delete", help="remove records")
+    p.add_argument("codes", nargs="+")
+    p.set_defaults(run=cmd_delete)
+
+    for name, run in (("top", cmd_top), ("bottom", cmd_bottom)):
+        p = commands.add_parser(name, help=f"print the {name} N students by total")
+        p.add_argument("n", type=int, nargs="?", default=1)
+        p.set_defaults(run=run)
+
+    p = commands.add_parser("sort", help="print all records in order")
+    p.add_argument("--by", choices=("name", "code", "total"), default="name")
+    p.add_argument("--reverse", action="store_true")
+    p.set_defaults(run=cmd_sort)
+
+    p = commands.add_parser("import", help="bulk-import a CSV of code,name,cw1,cw2,cw3,exam rows")
+    p.add_argument("csv")
+    p.set_defaults(run=cmd_import)
+
+    p = commands.add_parser("export", help="write all records to a .csv, .txt, .smb, .smz or .db file")
+    p.add_argument("dest")
+    p.set_defaults(run=cmd_export)
+
+    p = commands.add_parser("report", help="write a .csv or .html report with totals and grades")
+    p.add_argument("dest")
+    p.add_argument("--where", help="only records matching a filter")
+    p.add_argument("--by", choices=("name", "code", "total"), help="sort order (default: file order)")
+    p.add_argument("--reverse", action="store_true")
+    p.add_argument("--title", help="heading of an HTML report")
+    p.set_defaults(run=cmd_report)
+
+    p = commands.add_parser("restore", help="replace all records with those of a .smz archive")
+    p.add_argument("archive")
+    p.set_defaults(run=cmd_restore)
+
+    p = commands.add_parser("cohorts", help="summarise or query every marks file in a directory")
+    p.add_argument("directory")
+    p.add_argument("query", choices=("summary", "top", "bottom", "best", "history"), nargs="?", default="summary")
+    p.add_argument("arg", nargs="?", help="N for top, bottom and best; a student code for history")
+    p.add_argument("--min-cohorts", type=int, default=1, help="best: only students in this many cohorts")
+    p.set_defaults(run=cmd_cohorts)
+
+    commands.add_parser("gui", help="open the Student Manager window").set_defaults(run=cmd_gui)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.run(args) or 0
+    except CommandError as e:
+        print(f"student_cli: {e}", file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        # Output piped into head and the like
+        return 0
+    except OSError as e:
+        print(f"student_cli: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
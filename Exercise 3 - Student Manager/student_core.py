@@ -0,0 +1,3046 @@
+"""Student Manager data layer: loading, storing, indexing and querying marks.
+
+Nothing here imports tkinter, so scripts and the command line (student_cli.py)
+can use it on machines without a display.
+"""
+
+import os
+import re
+import csv
+import sqlite3
+import sys
+import math
+import threading
+import statistics
+import heapq
+import tempfile
+import contextlib
+import functools
+import json
+import html
+import time
+import zlib
+from urllib.parse import urlsplit, quote, urlencode
+from operator import itemgetter, attrgetter, add, mul
+from collections import Counter
+import mmap
+import struct
+from array import array
+from bisect import bisect_left, insort
+from itertools import accumulate, repeat
+
+try:
+    import fcntl
+except ImportError:
+    # Windows locks the data file's lock file with msvcrt instead
+    fcntl = None
+    import msvcrt
+
+# NumPy takes longer to import than most commands take to run, so it is
+# only imported by load_numpy() when a batch computation first needs it
+np = None
+_numpy_checked = False
+
+DATA_FILE = "studentmarks.text.txt"
+MAX_CW = 20
+MAX_EXAM = 100
+MAX_TOTAL = 3 * MAX_CW + MAX_EXAM
+
+# Edits are appended to "<data file>.journal" and folded back into the
+# data file once the journal grows past this many bytes.
+JOURNAL_SUFFIX = ".journal"
+JOURNAL_COMPACT_BYTES = 256 * 1024
+
+# add_many inserts a batch into the existing indexes one record at a time
+# when the store holds at least this many times as many records, and
+# otherwise rebuilds them, which costs about this many single inserts
+BATCH_REBUILD_RATIO = 1000
+
+# Writers from every process hold a lock on "<data file>.lock" while they
+# append to the journal or compact it
+LOCK_SUFFIX = ".lock"
+
+# Text files larger than this are split into byte ranges and parsed in a
+# process pool. Lines with bad marks are written to "<data file>.rejects".
+PARALLEL_PARSE_BYTES = 32 * 1024 * 1024
+PARSE_CHUNK_BYTES = 8 * 1024 * 1024
+PARSE_WORKERS = None
+REJECTS_SUFFIX = ".rejects"
+
+# Background jobs check for cancellation and report progress this often
+PROGRESS_EVERY_LINES = 20000
+
+# Data files ending in one of these are SQLite databases
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+# A "data file" starting with http:// is a student_server.py instance.
+# Records are fetched from it this many at a time.
+REMOTE_PAGE_SIZE = 5000
+REMOTE_TIMEOUT = 30
+
+# Data files ending in ".smb" use the columnar binary layout instead of text
+BINARY_SUFFIX = ".smb"
+BINARY_MAGIC = b"SMB1"
+BINARY_HEADER = struct.Struct("<4sI")
+MARK_COLUMNS = ("cw1", "cw2", "cw3", "exam")
+
+# Data files ending in ".smz" are compressed archives of the same columns,
+# for copying cohorts between machines and keeping one per term
+ARCHIVE_SUFFIX = ".smz"
+ARCHIVE_MAGIC = b"SMZ1"
+ARCHIVE_HEADER = struct.Struct("<4sBxxxQQI")
+ARCHIVE_BLOCK = struct.Struct("<III")
+ARCHIVE_CODEC_ZLIB = 1
+ARCHIVE_LEVEL = 6
+ARCHIVE_BLOCK_RECORDS = 65536
+ARCHIVE_READ_BYTES = 1024 * 1024
+
+# A directory of marks files is opened as one cohort per file. Directories
+# bigger than COHORT_PARALLEL_BYTES are read by a process pool, one file per
+# worker. Each cohort's summary keeps its COHORT_EXTREMES best and worst.
+COHORT_SUFFIXES = (".txt", BINARY_SUFFIX, ARCHIVE_SUFFIX) + SQLITE_SUFFIXES
+COHORT_PARALLEL_BYTES = 4 * 1024 * 1024
+COHORT_EXTREMES = 10
+
+# Reports are written this many rows at a time. Files ending in one of
+# REPORT_HTML_SUFFIXES get an HTML table, anything else CSV.
+EXPORT_CHUNK_ROWS = 5000
+REPORT_HTML_SUFFIXES = (".html", ".htm")
+REPORT_HTML_STYLE = ("body{font-family:sans-serif}table{border-collapse:collapse}"
+                     "th,td{border:1px solid #ccc;padding:2px 8px}td{text-align:center}"
+                     "tbody tr:nth-child(even){background:#f4f4f4}")
+
+# Grade boundaries as a percentage of MAX_TOTAL, best first
+GRADE_BANDS = (("A", 70), ("B", 60), ("C", 50), ("D", 40), ("F", 0))
+STAT_PERCENTILES = (10, 25, 75, 90)
+
+# Fuzzy name matches must share at least this fraction of the typed text's
+# trigrams. Each typed word is matched against at most FUZZY_WORD_MATCHES
+# of the most similar indexed words.
+FUZZY_MIN_SCORE = 0.4
+FUZZY_WORD_MATCHES = 25
+
+class IOCounters:
+    """Running totals of data-file bytes read and written, for instrumentation.
+
+    read and written cover the whole process. thread() returns the totals
+    of the calling thread alone, so I/O done on a background thread is not
+    charged to whatever the GUI thread was timing meanwhile.
+    """
+
+    def __init__(self):
+        self.read = 0
+        self.written = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def count(self, read=0, written=0):
+        with self._lock:
+            self.read += read
+            self.written += written
+        local = self._local
+        local.read = getattr(local, "read", 0) + read
+        local.written = getattr(local, "written", 0) + written
+
+    def thread(self):
+        """Returns (bytes read, bytes written) by the calling thread so far."""
+        return getattr(self._local, "read", 0), getattr(self._local, "written", 0)
+
+io_counters = IOCounters()
+
+def load_numpy():
+    """Returns the numpy module, importing it on first use, or None without it."""
+    global np, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+        except ImportError:
+            # Batch work falls back to plain Python without NumPy
+            numpy = None
+        np, _numpy_checked = numpy, True
+    return np
+
+class ConflictError(Exception):
+    """Another user changed the same fields of a record since it was read."""
+
+    def __init__(self, code, fields):
+        self.code = code
+        self.fields = fields
+        if fields:
+            detail = "changed " + ", ".join(fields)
+        else:
+            detail = "deleted the record"
+        super().__init__(f"Someone else {detail} for {code} since you loaded it.")
+
+class Cancelled(Exception):
+    """Raised inside a background job when the user cancels it."""
+
+def check_cancelled(cancel):
+    """Raises Cancelled if the job's cancel event has been set."""
+    if cancel is not None and cancel.is_set():
+        raise Cancelled()
+
+def track_progress(lines, size, cancel=None, progress=None):
+    """Passes lines through, reporting the fraction read and stopping if cancelled."""
+    if cancel is None and progress is None:
+        yield from lines
+        return
+    done = 0
+    for i, line in enumerate(lines, 1):
+        done += len(line)
+        if i % PROGRESS_EVERY_LINES == 0:
+            check_cancelled(cancel)
+            if progress is not None and size:
+                progress(min(done / size, 1.0))
+        yield line
+
+def student_key(code):
+    """Returns the case-insensitive lookup key for a student code."""
+    return code.strip().casefold()
+
+class Student:
+    """One student's record, with the total of the marks cached.
+
+    Marks must be changed through update(), which recomputes the total.
+    """
+
+    __slots__ = ("code", "name", "cw1", "cw2", "cw3", "exam", "total")
+
+    FIELDS = ("code", "name") + MARK_COLUMNS
+
+    def __init__(self, code, name, cw1, cw2, cw3, exam):
+        self.code = code
+        self.name = name
+        self.cw1 = cw1
+        self.cw2 = cw2
+        self.cw3 = cw3
+        self.exam = exam
+        self.total = cw1 + cw2 + cw3 + exam
+
+    def __repr__(self):
+        return f"Student({self.code!r}, {self.name!r}, {self.cw1}, {self.cw2}, {self.cw3}, {self.exam})"
+
+    def fields(self):
+        """Returns (code, name, cw1, cw2, cw3, exam)."""
+        return (self.code, self.name, self.cw1, self.cw2, self.cw3, self.exam)
+
+    def copy(self):
+        return Student(*self.fields())
+
+    def as_dict(self):
+        """Returns the record as a JSON-ready dict, total included."""
+        return dict(zip(Student.FIELDS + ("total",), self.fields() + (self.total,)))
+
+    @classmethod
+    def from_dict(cls, data):
+        """Builds a record from a dict like as_dict() returns; the total is ignored."""
+        return cls(*(data[field] for field in cls.FIELDS))
+
+    def update(self, fields):
+        """Sets fields from a {field: value} mapping or from another Student."""
+        if isinstance(fields, Student):
+            fields = zip(Student.FIELDS, fields.fields())
+        else:
+            fields = fields.items()
+        for field, value in fields:
+            setattr(self, field, value)
+        self.total = self.cw1 + self.cw2 + self.cw3 + self.exam
+
+def parse_record(parts):
+    """Builds a student record from the six fields of a line. Raises ValueError on bad marks."""
+    code, name, c1, c2, c3, exam = parts
+    return Student(code, name, int(c1), int(c2), int(c3), int(exam))
+
+def format_record(s):
+    """Formats a student record as a comma-separated line."""
+    return f"{s.code},{s.name},{s.cw1},{s.cw2},{s.cw3},{s.exam}\n"
+
+def journal_path(path=DATA_FILE):
+    """Returns the path of the change journal that belongs to a data file."""
+    return path + JOURNAL_SUFFIX
+
+def iter_students(lines, rejects):
+    """Yields records parsed from text lines, one at a time.
+
+    Lines without six fields are skipped; lines whose marks are not integers
+    are appended to `rejects`.
+    """
+    for line in lines:
+        parts = line.strip().split(",")
+        if len(parts) != 6:
+            continue
+        try:
+            # Robustly attempt to convert marks to integers
+            yield parse_record(parts)
+        except ValueError:
+            rejects.append(line.strip())
+
+def parse_chunk(path, start, end):
+    """Parses the lines that begin inside byte range [start, end) of a text file.
+
+    Returns (records, rejected lines), so chunks can be parsed in separate
+    processes and joined back together in order.
+    """
+    with open(path, "rb") as f:
+        if start:
+            # Skip the tail of a line that began in the previous chunk
+            f.seek(start - 1)
+            f.readline()
+            start = f.tell()
+        data = f.read(max(0, end - start))
+        if data and not data.endswith(b"\n"):
+            # Finish the last line, which runs on into the next chunk
+            data += f.readline()
+
+    rejects = []
+    records = list(iter_students(data.decode().split("\n"), rejects))
+    return records, rejects
+
+def parse_parallel(path, chunk_bytes=PARSE_CHUNK_BYTES, cancel=None, progress=None):
+    """Parses a large text file in byte-range chunks across a process pool."""
+    size = os.path.getsize(path)
+    starts = list(range(0, size, chunk_bytes))
+    ends = starts[1:] + [size]
+
+    # Only big files need the pool, so don't pay for importing it up front
+    from concurrent.futures import ProcessPoolExecutor
+
+    records, rejects = [], []
+    with ProcessPoolExecutor(max_workers=PARSE_WORKERS) as pool:
+        futures = [pool.submit(parse_chunk, path, start, end) for start, end in zip(starts, ends)]
+        try:
+            for done, future in enumerate(futures, 1):
+                chunk_records, chunk_rejects = future.result()
+                records.extend(chunk_records)
+                rejects.extend(chunk_rejects)
+                check_cancelled(cancel)
+                if progress is not None:
+                    progress(done / len(futures))
+        except Cancelled:
+            for future in futures:
+                future.cancel()
+            raise
+    return records, rejects
+
+def report_rejects(path, rejects):
+    """Writes rejected lines to the side file, ending with a one-line summary.
+
+    Nothing is printed, so commands whose output is data (such as
+    `student_cli.py list > out.csv`) stay clean.
+    """
+    rejects_path = path + REJECTS_SUFFIX
+    try:
+        if not rejects:
+            if os.path.exists(rejects_path):
+                os.remove(rejects_path)
+            return
+        with open(rejects_path, "w") as f:
+            f.writelines(line + "\n" for line in rejects)
+            f.write(f"# Skipped {len(rejects)} corrupted record(s) in '{path}'.\n")
+    except OSError:
+        # A read-only directory or share; the records still load
+        pass
+
+def read_snapshot(path=DATA_FILE, cancel=None, progress=None):
+    """Reads the base data file only, without applying the journal."""
+    if not os.path.exists(path):
+        return []
+    size = os.path.getsize(path)
+    io_counters.count(read=size)
+    if is_binary_file(path):
+        with BinaryMarks(path) as marks:
+            return list(marks)
+    if is_archive_file(path):
+        return read_archive(path, cancel, progress)
+
+    if size > PARALLEL_PARSE_BYTES:
+        students, rejects = parse_parallel(path, cancel=cancel, progress=progress)
+    else:
+        rejects = []
+        with open(path, "r") as f:
+            students = list(iter_students(track_progress(f, size, cancel, progress), rejects))
+    report_rejects(path, rejects)
+    return students
+
+def parse_journal(text):
+    """Parses complete journal lines into ("+", record) and ("-", code) changes."""
+    changes = []
+    for line in text.splitlines():
+        op, _, rest = line.partition(",")
+        if op == "+":
+            parts = rest.split(",")
+            if len(parts) != 6:
+                continue
+            try:
+                changes.append(("+", parse_record(parts)))
+            except ValueError:
+                continue
+        elif op == "-":
+            changes.append(("-", rest))
+    return changes
+
+def read_journal(path=DATA_FILE, offset=0):
+    """Reads the journal entries from a byte offset on.
+
+    Returns (changes, offset just past them), so the next call only reads
+    what other writers appended since.
+    """
+    try:
+        f = open(journal_path(path), "rb")
+    except FileNotFoundError:
+        return [], 0
+    with f:
+        f.seek(offset)
+        data = f.read()
+    io_counters.count(read=len(data))
+    # A torn final entry from an interrupted write never happened
+    end = data.rfind(b"\n") + 1
+    return parse_journal(data[:end].decode()), offset + end
+
+def apply_changes(students, changes):
+    """Applies journal changes on top of a list of records."""
+    by_key = {}
+    for s in students:
+        by_key.setdefault(student_key(s.code), s)
+
+    for op, payload in changes:
+        if op == "+":
+            key = student_key(payload.code)
+            existing = by_key.get(key)
+            if existing is not None:
+                existing.update(payload)
+            else:
+                by_key[key] = payload
+        else:
+            by_key.pop(student_key(payload), None)
+    return list(by_key.values())
+
+def replay_journal(students, path=DATA_FILE):
+    """Applies the journalled changes for a data file on top of its records."""
+    if not os.path.exists(journal_path(path)):
+        return students
+    return apply_changes(students, read_journal(path)[0])
+
+def load_students(path=DATA_FILE, cancel=None, progress=None):
+    """Loads student data from the file, handling potential bad data."""
+    return replay_journal(read_snapshot(path, cancel, progress), path)
+
+def drop_torn_entry(jpath):
+    """Truncates a journal back to its last complete line after a crash mid-append."""
+    if not os.path.exists(jpath):
+        return
+    with open(jpath, "r+b") as f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        while pos > 0:
+            step = min(4096, pos)
+            f.seek(pos - step)
+            chunk = f.read(step)
+            newline = chunk.rfind(b"\n")
+            if newline != -1:
+                pos = pos - step + newline + 1
+                break
+            pos -= step
+        if pos != end:
+            f.truncate(pos)
+
+def append_journal(entries, path=DATA_FILE):
+    """Appends journal entries in a single write and flushes them to disk."""
+    drop_torn_entry(journal_path(path))
+    text = "".join(entries)
+    with open(journal_path(path), "a") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    io_counters.count(written=len(text))
+
+def journal_upsert(s):
+    """Returns the journal entry that adds or replaces a student record."""
+    return "+," + format_record(s)
+
+def journal_delete(code):
+    """Returns the journal entry that removes a student record."""
+    return f"-,{code}\n"
+
+class FileLock:
+    """Lock on "<data file>.lock", shared by every process using the file.
+
+    Re-entrant within a process, so a store can hold it across catching up
+    with other writers and appending its own change. Writers lock it
+    exclusively. Readers use reading(), which takes a shared lock, so
+    processes can read at the same time, and which still works where the
+    lock file cannot be created. Threads of one process take turns, as
+    they share the backend's place in the journal.
+    """
+
+    def __init__(self, path=DATA_FILE):
+        self.path = path + LOCK_SUFFIX
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+        self._shared = False
+
+    def __enter__(self):
+        self._acquire(writing=True)
+        return self
+
+    @contextlib.contextmanager
+    def reading(self):
+        """Holds the lock for a read, or reads unlocked if there is no lock file and none can be made.
+
+        That happens in a read-only directory or share, where nobody can
+        be writing through this lock anyway.
+        """
+        locked = self._acquire(writing=False)
+        try:
+            yield self
+        finally:
+            if locked:
+                self.__exit__()
+
+    def _open(self, writing):
+        try:
+            return open(self.path, "a+b")
+        except OSError:
+            if writing:
+                raise
+        # A read-only location; an existing lock file can still be locked
+        try:
+            return open(self.path, "rb")
+        except OSError:
+            return None
+
+    def _acquire(self, writing):
+        """Takes the lock. Returns False if a reader went without."""
+        self._thread_lock.acquire()
+        try:
+            if self._depth == 0:
+                self._file = self._open(writing)
+                if self._file is None:
+                    self._thread_lock.release()
+                    return False
+                self._lock(shared=not writing)
+            elif writing and self._shared:
+                # A write inside a read; flock converts the lock in place
+                self._lock(shared=False)
+        except BaseException:
+            if self._depth == 0 and self._file is not None:
+                self._file.close()
+                self._file = None
+            self._thread_lock.release()
+            raise
+        self._depth += 1
+        return True
+
+    def _lock(self, shared):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            self._shared = shared
+        else:
+            # msvcrt has no shared locks, so readers lock exclusively too
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+
+def file_signature(path):
+    """Returns (mtime, size, inode) for a file, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def save_students(students, path=DATA_FILE):
+    """Saves student data back to the file as a fresh snapshot.
+
+    The data is written to a uniquely named temporary file and swapped in
+    with os.replace, so a crash leaves either the old or the new file, never
+    half of one. The journal is only removed after the swap; replaying it
+    again over the new snapshot is harmless because every entry is an
+    idempotent upsert or delete.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=directory)
+    try:
+        if is_binary_file(path):
+            os.close(fd)
+            write_binary(students, tmp_path)
+        elif is_archive_file(path):
+            os.close(fd)
+            write_archive(students, tmp_path)
+        else:
+            with os.fdopen(fd, "w") as f:
+                for s in students:
+                    # Ensure data being saved is correctly formatted
+                    f.write(format_record(s))
+                f.flush()
+                os.fsync(f.fileno())
+        # mkstemp creates the file private; keep the data file's permissions
+        try:
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o7777)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, path)
+        io_counters.count(written=os.path.getsize(path))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    if os.path.exists(journal_path(path)):
+        os.remove(journal_path(path))
+
+def validate_field(field, value):
+    """Validates a student code or name.
+
+    Returns (True, stripped value) or (False, message). Commas and line
+    breaks are refused because they would split the record when the data
+    file or journal is read back.
+    """
+    value = value.strip()
+    label = "Student code" if field == "code" else "Name"
+    if "," in value or value.splitlines() not in ([], [value]):
+        return False, f"{label} cannot contain commas or line breaks."
+    if field == "code" and not value:
+        return False, "Student code cannot be empty."
+    return True, value
+
+def validate_marks(cw1_str, cw2_str, cw3_str, exam_str):
+    """Validates mark inputs are integers and within defined limits."""
+    try:
+        cw1 = int(cw1_str)
+        cw2 = int(cw2_str)
+        cw3 = int(cw3_str)
+        exam = int(exam_str)
+    except ValueError:
+        return False, "All coursework and exam marks must be integers."
+
+    if not (0 <= cw1 <= MAX_CW and 0 <= cw2 <= MAX_CW and 0 <= cw3 <= MAX_CW):
+        return False, f"CW marks must be between 0 and {MAX_CW}."
+    if not (0 <= exam <= MAX_EXAM):
+        return False, f"Exam mark must be between 0 and {MAX_EXAM}."
+
+    return True, (cw1, cw2, cw3, exam)
+
+
+
+#   BINARY MARKS FORMAT
+#
+#   header   magic "SMB1", student count n
+#   columns  cw1, cw2, cw3, exam as n little-endian int16 values each
+#   offsets  n + 1 uint32 offsets into the code blob, then into the name blob
+#   blobs    UTF-8 codes, then UTF-8 names
+#
+#   The store loads every record into memory and answers lookups from its
+#   own indexes, so the file only has to be fast to read in full.
+
+def is_binary_file(path):
+    """Returns True if a data file uses the binary marks format."""
+    return path.lower().endswith(BINARY_SUFFIX)
+
+def _little_endian(arr):
+    if sys.byteorder != "little":
+        arr.byteswap()
+    return arr
+
+def _blob_offsets(chunks):
+    offsets = array("I", [0])
+    for chunk in chunks:
+        offsets.append(offsets[-1] + len(chunk))
+    return offsets
+
+def write_binary(students, path):
+    """Writes student records to a file in the binary marks format."""
+    students = list(students)
+    codes = [s.code.encode() for s in students]
+    names = [s.name.encode() for s in students]
+
+    sections = [array("h", map(attrgetter(c), students)) for c in MARK_COLUMNS]
+    sections.append(_blob_offsets(codes))
+    sections.append(_blob_offsets(names))
+
+    with open(path, "wb") as f:
+        f.write(BINARY_HEADER.pack(BINARY_MAGIC, len(students)))
+        for section in sections:
+            _little_endian(section).tofile(f)
+        f.write(b"".join(codes))
+        f.write(b"".join(names))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class BinaryMarks:
+    """Read-only, memory-mapped view of a binary marks file.
+
+    Nothing is parsed up front: marks are read straight out of the integer
+    columns and codes and names are decoded as each row is read.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            # mmap refuses empty files, so check for a header first
+            if os.fstat(f.fileno()).st_size < BINARY_HEADER.size:
+                raise ValueError(f"'{path}' is not a student binary file.")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = []
+
+        try:
+            magic, n = BINARY_HEADER.unpack_from(self._map, 0)
+            if magic != BINARY_MAGIC:
+                raise ValueError(f"'{path}' is not a student binary file.")
+            self._count = n
+            self._pos = BINARY_HEADER.size
+
+            self._columns = {c: self._section("h", n) for c in MARK_COLUMNS}
+            self._code_offsets = self._section("I", n + 1)
+            self._name_offsets = self._section("I", n + 1)
+            self._codes = self._section("B", self._code_offsets[n])
+            self._names = self._section("B", self._name_offsets[n])
+        except ValueError:
+            self.close()
+            raise
+
+    def _section(self, fmt, count):
+        size = count * array(fmt).itemsize
+        if self._pos + size > len(self._map):
+            raise ValueError(f"'{self.path}' is not a student binary file, or is truncated.")
+        raw = memoryview(self._map)[self._pos:self._pos + size]
+        self._pos += size
+        self._views.append(raw)
+        if sys.byteorder != "little" and fmt != "B":
+            section = array(fmt, raw)
+            section.byteswap()
+            return section
+        view = raw.cast(fmt)
+        self._views.append(view)
+        return view
+
+    def close(self):
+        """Releases the memory map."""
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def code(self, i):
+        o = self._code_offsets
+        return bytes(self._codes[o[i]:o[i + 1]]).decode()
+
+    def name(self, i):
+        o = self._name_offsets
+        return bytes(self._names[o[i]:o[i + 1]]).decode()
+
+    def __getitem__(self, i):
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        return Student(self.code(i), self.name(i), *(self._columns[c][i] for c in MARK_COLUMNS))
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self[i]
+
+
+
+#   COMPRESSED ARCHIVES
+#
+#   header   magic "SMZ1", codec, student count, payload bytes, payload CRC32
+#   payload  zlib stream of blocks of up to ARCHIVE_BLOCK_RECORDS records:
+#            count n, code bytes, name bytes, then cw1, cw2, cw3, exam as
+#            n little-endian int16 values each, then the length in
+#            characters of each code and of each name as n uint32 values
+#            each, then the concatenated UTF-8 codes and names
+#
+#   The lengths mean a code or name may hold any character, separators
+#   included.
+#
+#   Each block decodes with a handful of C-level calls, so loading an
+#   archive is bound by decompression and building the records rather than
+#   by parsing text.
+
+def is_archive_file(path):
+    """Returns True if a data file is a compressed archive."""
+    return path.lower().endswith(ARCHIVE_SUFFIX)
+
+def _archive_block(students):
+    codes = [s.code for s in students]
+    names = [s.name for s in students]
+    code_blob = "".join(codes).encode()
+    name_blob = "".join(names).encode()
+    parts = [ARCHIVE_BLOCK.pack(len(students), len(code_blob), len(name_blob))]
+    parts.extend(_little_endian(array("h", map(attrgetter(c), students))).tobytes() for c in MARK_COLUMNS)
+    parts.extend(_little_endian(array("I", map(len, strings))).tobytes() for strings in (codes, names))
+    parts += [code_blob, name_blob]
+    return b"".join(parts)
+
+def _split_lengths(text, lengths):
+    """Cuts text into consecutive pieces of the given lengths."""
+    ends = list(accumulate(lengths))
+    if (ends[-1] if ends else 0) != len(text):
+        raise ValueError("Archive block is corrupt.")
+    return list(map(text.__getitem__, map(slice, [0] + ends[:-1], ends)))
+
+def write_archive(students, path, level=ARCHIVE_LEVEL):
+    """Writes student records to a compressed archive. Returns the number written."""
+    students = list(students)
+    compressor = zlib.compressobj(level)
+    count = size = crc = 0
+    with open(path, "wb") as f:
+        # The header is filled in once the payload is known
+        f.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_CODEC_ZLIB, 0, 0, 0))
+        for start in range(0, len(students), ARCHIVE_BLOCK_RECORDS):
+            block = _archive_block(students[start:start + ARCHIVE_BLOCK_RECORDS])
+            count += min(ARCHIVE_BLOCK_RECORDS, len(students) - start)
+            size += len(block)
+            crc = zlib.crc32(block, crc)
+            f.write(compressor.compress(block))
+        f.write(compressor.flush())
+        f.seek(0)
+        f.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_CODEC_ZLIB, count, size, crc))
+        f.flush()
+        os.fsync(f.fileno())
+    return count
+
+def _decode_block(data, pos):
+    """Decodes the block at data[pos:]. Returns (records, end), or (None, pos) if it is incomplete."""
+    if len(data) - pos < ARCHIVE_BLOCK.size:
+        return None, pos
+    n, code_bytes, name_bytes = ARCHIVE_BLOCK.unpack_from(data, pos)
+    end = pos + ARCHIVE_BLOCK.size + 16 * n + code_bytes + name_bytes
+    if len(data) < end:
+        return None, pos
+    pos += ARCHIVE_BLOCK.size
+    columns = []
+    for _ in MARK_COLUMNS:
+        column = array("h")
+        column.frombytes(data[pos:pos + 2 * n])
+        columns.append(_little_endian(column))
+        pos += 2 * n
+    lengths = []
+    for _ in range(2):
+        column = array("I")
+        column.frombytes(data[pos:pos + 4 * n])
+        lengths.append(_little_endian(column))
+        pos += 4 * n
+    try:
+        codes = _split_lengths(data[pos:pos + code_bytes].decode(), lengths[0])
+        names = _split_lengths(data[pos + code_bytes:end].decode(), lengths[1])
+    except UnicodeDecodeError:
+        raise ValueError("Archive block is corrupt.")
+    if len(codes) != n or len(names) != n:
+        raise ValueError("Archive block is corrupt.")
+    return list(map(Student, codes, names, *columns)), end
+
+def iter_archive(path, cancel=None, progress=None):
+    """Yields the records of a compressed archive a block at a time.
+
+    The file is decompressed in ARCHIVE_READ_BYTES pieces, so memory stays
+    at about one block however large the archive is. Raises ValueError if
+    the file is not an archive, is truncated or fails its checksum; the
+    checksum can only be confirmed at the end, after every block has been
+    yielded.
+    """
+    size = os.path.getsize(path)
+    decompressor = zlib.decompressobj()
+    with open(path, "rb") as f:
+        header = f.read(ARCHIVE_HEADER.size)
+        if len(header) < ARCHIVE_HEADER.size:
+            raise ValueError(f"'{path}' is not a student archive.")
+        magic, codec, count, payload, expected_crc = ARCHIVE_HEADER.unpack(header)
+        if magic != ARCHIVE_MAGIC:
+            raise ValueError(f"'{path}' is not a student archive.")
+        if codec != ARCHIVE_CODEC_ZLIB:
+            raise ValueError(f"'{path}' uses an unknown compression ({codec}).")
+
+        buffer, seen, crc, decoded = b"", 0, 0, 0
+        while True:
+            check_cancelled(cancel)
+            chunk = f.read(ARCHIVE_READ_BYTES)
+            try:
+                data = decompressor.decompress(chunk) if chunk else decompressor.flush()
+            except zlib.error as e:
+                raise ValueError(f"'{path}' is corrupt: {e}")
+            seen += len(data)
+            crc = zlib.crc32(data, crc)
+            buffer += data
+            pos = 0
+            while True:
+                students, pos = _decode_block(buffer, pos)
+                if students is None:
+                    break
+                decoded += len(students)
+                yield students
+            buffer = buffer[pos:]
+            if progress is not None:
+                progress(f.tell() / size if size else 1.0)
+            if not chunk:
+                break
+
+    if buffer or not decompressor.eof or seen != payload or decoded != count:
+        raise ValueError(f"'{path}' is truncated or corrupt.")
+    if crc != expected_crc:
+        raise ValueError(f"'{path}' failed its checksum.")
+
+def read_archive(path, cancel=None, progress=None):
+    """Returns every record in a compressed archive."""
+    students = []
+    for block in iter_archive(path, cancel, progress):
+        students.extend(block)
+    return students
+
+def restore_archive(path, store, cancel=None, progress=None):
+    """Replaces everything in the store with the records of an archive. Returns how many."""
+    students = read_archive(path, cancel, progress)
+    store.replace_all(students)
+    return len(students)
+
+
+
+#   COHORT STATISTICS
+
+def grade_for(total):
+    """Returns the letter grade for a total score."""
+    percent = 100 * total / MAX_TOTAL
+    for grade, floor in GRADE_BANDS:
+        if percent >= floor:
+            return grade
+    return GRADE_BANDS[-1][0]
+
+def cohort_statistics(columns):
+    """Summarises the marks columns (as returned by StudentStore.columns()).
+
+    Returns a dict with the student count, per-column summaries
+    (mean, median, std, then STAT_PERCENTILES), grade counts and
+    coursework/exam correlations, or None for an empty cohort. Uses one
+    vectorised NumPy pass when NumPy is installed.
+    """
+    if not len(columns["exam"]):
+        return None
+    if load_numpy() is not None:
+        return _cohort_statistics_numpy(columns)
+    return _cohort_statistics_python(columns)
+
+STAT_LABELS = ("CW1", "CW2", "CW3", "Exam", "Total")
+CORRELATION_LABELS = ("CW1 vs Exam", "CW2 vs Exam", "CW3 vs Exam", "CW total vs Exam")
+
+def _cohort_statistics_numpy(columns):
+    marks = np.array([columns[c] for c in MARK_COLUMNS], dtype=np.int64)
+    cw_total = marks[:3].sum(axis=0)
+    totals = cw_total + marks[3]
+    data = np.vstack([marks, totals]).astype(np.float64)
+
+    summary = np.vstack([
+        data.mean(axis=1),
+        np.median(data, axis=1),
+        data.std(axis=1),
+        np.percentile(data, STAT_PERCENTILES, axis=1),
+    ])
+
+    floors = [floor for _, floor in reversed(GRADE_BANDS)]
+    band = np.searchsorted(floors, totals * 100 / MAX_TOTAL, side="right") - 1
+    counts = np.bincount(np.clip(band, 0, len(floors) - 1), minlength=len(floors))[::-1]
+
+    if marks.shape[1] > 1:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = np.corrcoef(np.vstack([marks[:3], cw_total, marks[3]]))[-1, :-1]
+    else:
+        corr = np.full(len(CORRELATION_LABELS), np.nan)
+
+    return {
+        "count": marks.shape[1],
+        "summary": dict(zip(STAT_LABELS, summary.T.tolist())),
+        "grades": dict(zip((g for g, _ in GRADE_BANDS), counts.tolist())),
+        "correlations": dict(zip(CORRELATION_LABELS, corr.tolist())),
+    }
+
+def _cohort_statistics_python(columns):
+    marks = [list(columns[c]) for c in MARK_COLUMNS]
+    cw_total = [a + b + c for a, b, c in zip(*marks[:3])]
+    totals = [cw + exam for cw, exam in zip(cw_total, marks[3])]
+
+    summary = {}
+    for label, data in zip(STAT_LABELS, marks + [totals]):
+        if len(data) > 1:
+            cuts = statistics.quantiles(data, n=100, method="inclusive")
+            percentiles = [cuts[p - 1] for p in STAT_PERCENTILES]
+        else:
+            percentiles = [float(data[0])] * len(STAT_PERCENTILES)
+        summary[label] = [statistics.fmean(data), statistics.median(data), statistics.pstdev(data)] + percentiles
+
+    grades = dict.fromkeys((g for g, _ in GRADE_BANDS), 0)
+    for total in totals:
+        grades[grade_for(total)] += 1
+
+    correlations = {}
+    for label, data in zip(CORRELATION_LABELS, marks[:3] + [cw_total]):
+        try:
+            correlations[label] = statistics.correlation(data, marks[3])
+        except statistics.StatisticsError:
+            correlations[label] = math.nan
+
+    return {"count": len(totals), "summary": summary, "grades": grades, "correlations": correlations}
+
+
+
+#   MARK DISTRIBUTION
+
+# Histogram columns, each with the largest value it can hold
+DISTRIBUTION_COLUMNS = {"total": MAX_TOTAL, "exam": MAX_EXAM, "cw": 3 * MAX_CW}
+
+class MarkDistribution:
+    """Counts of students per mark value, for drawing charts of any cohort size.
+
+    Marks are small integers, so a histogram is one count per possible
+    value and the coursework-vs-exam scatter is one count per (coursework
+    total, exam) cell. Their size depends on MAX_CW and MAX_EXAM, never on
+    the number of students, and an edit only moves one count. Marks outside
+    the scale (bad marks in the file) are counted at its nearest end, as
+    RankingIndex does.
+    """
+
+    def __init__(self, columns=None):
+        self.count = 0
+        self.histograms = {c: [0] * (top + 1) for c, top in DISTRIBUTION_COLUMNS.items()}
+        self.grid = [[0] * (MAX_EXAM + 1) for _ in range(3 * MAX_CW + 1)]
+        if columns is not None and len(columns["exam"]):
+            self._build(columns)
+
+    def _build(self, columns):
+        """Counts every student in the marks columns (from StudentStore.columns())."""
+        cw = [a + b + c for a, b, c in zip(columns["cw1"], columns["cw2"], columns["cw3"])]
+        exam = columns["exam"]
+        if load_numpy() is not None:
+            cw = np.clip(np.asarray(cw, dtype=np.int64), 0, 3 * MAX_CW)
+            exam = np.clip(np.asarray(exam, dtype=np.int64), 0, MAX_EXAM)
+            cells = np.bincount(cw * (MAX_EXAM + 1) + exam, minlength=len(self.grid) * (MAX_EXAM + 1))
+            self.grid = cells.reshape(len(self.grid), MAX_EXAM + 1).tolist()
+        else:
+            for (c, e), n in Counter(zip(cw, exam)).items():
+                c, e = self._cell(c, e)
+                self.grid[c][e] += n
+        self._histograms_from_grid()
+        self.count = len(exam)
+
+    def _histograms_from_grid(self):
+        hist = self.histograms
+        for c, row in enumerate(self.grid):
+            hist["cw"][c] = sum(row)
+            for e, n in enumerate(row):
+                if n:
+                    hist["exam"][e] += n
+                    hist["total"][c + e] += n
+
+    @staticmethod
+    def _cell(cw, exam):
+        return max(0, min(cw, 3 * MAX_CW)), max(0, min(exam, MAX_EXAM))
+
+    def _move(self, s, delta):
+        cw, exam = self._cell(s.cw1 + s.cw2 + s.cw3, s.exam)
+        self.grid[cw][exam] += delta
+        self.histograms["cw"][cw] += delta
+        self.histograms["exam"][exam] += delta
+        self.histograms["total"][cw + exam] += delta
+        self.count += delta
+
+    def apply(self, action, student, old):
+        """Updates the counts for one store change. Returns False if a rebuild is needed."""
+        if action == "add":
+            self._move(student, 1)
+        elif action == "delete":
+            self._move(student, -1)
+        elif action == "update":
+            self._move(old, -1)
+            self._move(student, 1)
+        else:
+            return False
+        return True
+
+    def bins(self, column, n):
+        """Returns the histogram of a column merged into at most n equal-width bins.
+
+        Each bin is (first value, last value, count).
+        """
+        counts = self.histograms[column]
+        width = max(1, math.ceil(len(counts) / max(1, n)))
+        return [(start, min(start + width, len(counts)) - 1, sum(counts[start:start + width]))
+                for start in range(0, len(counts), width)]
+
+    def cells(self, cw_bins, exam_bins):
+        """Returns the scatter counts merged into a grid of at most cw_bins x exam_bins.
+
+        Each cell is (first cw, last cw, first exam, last exam, count); empty
+        cells are left out.
+        """
+        cw_width = max(1, math.ceil(len(self.grid) / max(1, cw_bins)))
+        exam_width = max(1, math.ceil((MAX_EXAM + 1) / max(1, exam_bins)))
+        cells = []
+        for c0 in range(0, len(self.grid), cw_width):
+            rows = self.grid[c0:c0 + cw_width]
+            c1 = c0 + len(rows) - 1
+            for e0 in range(0, MAX_EXAM + 1, exam_width):
+                n = sum(sum(row[e0:e0 + exam_width]) for row in rows)
+                if n:
+                    cells.append((c0, c1, e0, min(e0 + exam_width, MAX_EXAM + 1) - 1, n))
+        return cells
+
+
+
+#   RANKING INDEX
+
+class RankingIndex:
+    """Students grouped into one bucket per total score, for ranking queries.
+
+    Totals are small bounded integers, so a Fenwick tree over the bucket
+    sizes counts the students above or below any score in O(log MAX_TOTAL).
+    Top/bottom N walk the buckets from either end and only touch the
+    students they return. Totals outside 0..MAX_TOTAL (bad marks in the
+    file) are clamped into the end buckets.
+    """
+
+    def __init__(self, students=()):
+        self._buckets = [{} for _ in range(MAX_TOTAL + 1)]
+        for s in students:
+            self._buckets[self._slot(s.total)][student_key(s.code)] = s
+        self._size = sum(map(len, self._buckets))
+
+        # Build the Fenwick tree over the bucket sizes in one linear pass
+        self._counts = [0] + [len(bucket) for bucket in self._buckets]
+        for i in range(1, len(self._counts)):
+            parent = i + (i & -i)
+            if parent < len(self._counts):
+                self._counts[parent] += self._counts[i]
+
+    @staticmethod
+    def _slot(total):
+        return max(0, min(total, MAX_TOTAL))
+
+    def _bump(self, slot, delta):
+        i = slot + 1
+        while i < len(self._counts):
+            self._counts[i] += delta
+            i += i & -i
+
+    def count_upto(self, total):
+        """Returns how many students have a total of at most `total`."""
+        if total < 0:
+            return 0
+        i = self._slot(total) + 1
+        count = 0
+        while i > 0:
+            count += self._counts[i]
+            i -= i & -i
+        return count
+
+    def __len__(self):
+        return self._size
+
+    def add(self, s, total=None):
+        slot = self._slot(s.total if total is None else total)
+        self._buckets[slot][student_key(s.code)] = s
+        self._bump(slot, 1)
+        self._size += 1
+
+    def remove(self, s, total=None):
+        slot = self._slot(s.total if total is None else total)
+        if self._buckets[slot].pop(student_key(s.code), None) is not None:
+            self._bump(slot, -1)
+            self._size -= 1
+
+    def top(self, n):
+        """Returns up to n students with the highest totals, best first."""
+        return self._walk(reversed(self._buckets), n)
+
+    def bottom(self, n):
+        """Returns up to n students with the lowest totals, worst first."""
+        return self._walk(self._buckets, n)
+
+    @staticmethod
+    def _walk(buckets, n):
+        found = []
+        for bucket in buckets:
+            for s in bucket.values():
+                if len(found) >= n:
+                    return found
+                found.append(s)
+        return found
+
+    def rank(self, s):
+        """Returns a student's position from the top (1 = best, ties share a rank)."""
+        return self._size - self.count_upto(self._slot(s.total)) + 1
+
+    def percentile(self, s):
+        """Returns the percentile rank of a student's total within the cohort."""
+        if not self._size:
+            return 0.0
+        slot = self._slot(s.total)
+        below = self.count_upto(slot - 1)
+        level = len(self._buckets[slot])
+        return 100.0 * (below + 0.5 * level) / self._size
+
+
+
+#   NAME INDEX
+
+def name_sort_key(s):
+    """Sort key for ordering students by name, with ties broken by code."""
+    return (s.name.casefold(), student_key(s.code))
+
+class NameIndex:
+    """Students kept sorted by name as records change.
+
+    Sorted views come straight from the index without re-sorting. Prefix
+    search matches the start of any word of a name ("sh" finds Alan
+    Shearer), or the start of the full name when the text contains a space,
+    in O(log n) plus the number of matches. The list of words costs more to
+    sort than the names themselves, so it is only built for the first
+    one-word search.
+    """
+
+    def __init__(self, students=()):
+        entries = sorted((name_sort_key(s), s) for s in students)
+        self._keys = [key for key, _ in entries]
+        self._students = [s for _, s in entries]
+        self._by_code = {key: s for (_, key), s in zip(self._keys, self._students)}
+        self._words = None
+
+    def words(self):
+        """Returns (word, code key) pairs in word order, sorting them the first time."""
+        if self._words is None:
+            self._words = sorted(
+                (word, key) for (name, key) in self._keys for word in name.split()
+            )
+        return self._words
+
+    def __len__(self):
+        return len(self._students)
+
+    def add(self, s):
+        key = name_sort_key(s)
+        i = bisect_left(self._keys, key)
+        self._keys.insert(i, key)
+        self._students.insert(i, s)
+        self._by_code[key[1]] = s
+        if self._words is not None:
+            for word in key[0].split():
+                insort(self._words, (word, key[1]))
+
+    def remove(self, s, name=None):
+        """Removes a student, indexed under `name` if it has since been renamed."""
+        key = ((s.name if name is None else name).casefold(), student_key(s.code))
+        i = bisect_left(self._keys, key)
+        if i == len(self._keys) or self._keys[i] != key:
+            return
+        del self._keys[i]
+        del self._students[i]
+        del self._by_code[key[1]]
+        if self._words is not None:
+            for word in key[0].split():
+                j = bisect_left(self._words, (word, key[1]))
+                del self._words[j]
+
+    def sorted(self):
+        """Returns all students in name order."""
+        return list(self._students)
+
+    def prefix(self, text, limit=None):
+        """Returns students, in name order, with a name word starting with text."""
+        text = " ".join(text.casefold().split())
+        if not text:
+            return []
+        pool = self._keys if " " in text else self.words()
+        found = {}
+        i = bisect_left(pool, (text,))
+        while i < len(pool) and pool[i][0].startswith(text):
+            found.setdefault(pool[i][1], self._by_code[pool[i][1]])
+            if limit is not None and len(found) >= limit:
+                break
+            i += 1
+        return sorted(found.values(), key=name_sort_key)
+
+    def between(self, low, high):
+        """Returns students whose names sort from low up to (not including) high."""
+        start = bisect_left(self._keys, (low.casefold(),))
+        stop = bisect_left(self._keys, (high.casefold(),))
+        return self._students[start:stop]
+
+
+
+#   FUZZY NAME INDEX
+
+def trigrams(text):
+    """Returns the set of three-letter slices of each word, padded as "  word "."""
+    grams = set()
+    for word in text.casefold().split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+class TrigramIndex:
+    """Inverted index from trigrams to name words, for misspelled names.
+
+    Each distinct word is indexed once, however many students share it, so
+    a search only counts shared trigrams over the posting lists of the
+    typed words instead of comparing the text with every record.
+    """
+
+    def __init__(self, students=()):
+        self._postings = {}
+        self._holders = {}
+        for s in students:
+            self.add(s)
+
+    def add(self, s):
+        key = student_key(s.code)
+        for word in set(s.name.casefold().split()):
+            holders = self._holders.get(word)
+            if holders is None:
+                holders = self._holders[word] = {}
+                for gram in trigrams(word):
+                    self._postings.setdefault(gram, set()).add(word)
+            holders[key] = s
+
+    def remove(self, s, name=None):
+        """Removes a student, indexed under `name` if it has since been renamed."""
+        key = student_key(s.code)
+        for word in set((s.name if name is None else name).casefold().split()):
+            holders = self._holders.get(word)
+            if holders is None or holders.pop(key, None) is None or holders:
+                continue
+            del self._holders[word]
+            for gram in trigrams(word):
+                words = self._postings[gram]
+                words.discard(word)
+                if not words:
+                    del self._postings[gram]
+
+    def similar_words(self, word, min_score=FUZZY_MIN_SCORE):
+        """Returns {indexed word: score} for the words most like word.
+
+        The score is the fraction of word's trigrams that the other word has.
+        """
+        grams = trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            words = self._postings.get(gram)
+            if words:
+                shared.update(words)
+        wanted = len(grams)
+        enough = min_score * wanted
+        # Keep the closest words overall: a padded word has len + 1 trigrams
+        candidates = [(n / (wanted + len(w) + 1 - n), n, w) for w, n in shared.items() if n >= enough]
+        return {w: n / wanted for _, n, w in heapq.nlargest(FUZZY_WORD_MATCHES, candidates)}
+
+    def search(self, text, limit=10, min_score=FUZZY_MIN_SCORE):
+        """Returns up to limit (score, student) pairs with names like text, best first.
+
+        Each typed word scores its best match among the words of a name, and
+        a student's score is the average over the typed words.
+
+        The matching words are ranked first, and their holders are only
+        visited in that order, one at a time, until no student still unseen
+        could beat the limit-th best. A common surname therefore costs no
+        more than a rare one. Among equal scores at the cut-off, the first
+        holders found are kept.
+        """
+        words = text.casefold().split()
+        if not words or limit <= 0:
+            return []
+        similar = [self.similar_words(word, min_score) for word in words]
+        ranked = [iter(sorted(matches.items(), key=itemgetter(1), reverse=True)) for matches in similar]
+        # For each typed word: the score of the match being visited, its
+        # unvisited holders and how many holders it has
+        cursors = [[0, iter(()), 0] for _ in words]
+
+        # Scores by name, as many students share theirs
+        names = {}
+
+        def score(name):
+            value = names.get(name)
+            if value is None:
+                name_words = set(name.casefold().split())
+                value = names[name] = sum(max(map(matches.get, name_words, repeat(0)))
+                                          for matches in similar) / len(words)
+            return value
+
+        def advance(cursor, ranking):
+            for match, value in ranking:
+                holders = self._holders[match]
+                cursor[:] = value, iter(holders.items()), len(holders)
+                return
+            cursor[0] = 0
+
+        for cursor, ranking in zip(cursors, ranked):
+            advance(cursor, ranking)
+        scored = {}
+        # The limit best scores so far, lowest first
+        top = []
+        while True:
+            # The best an unseen student could score
+            bound = sum(cursor[0] for cursor in cursors) / len(words)
+            if bound < min_score or bound == 0 or (len(top) == limit and top[0] >= bound):
+                break
+            # Visit holders of the typed word whose current match scores
+            # highest, the rarer match on a tie. The bound stays the same
+            # until that match runs out.
+            w = max(range(len(words)), key=lambda i: (cursors[i][0], -cursors[i][2]))
+            for key, s in cursors[w][1]:
+                if key in scored:
+                    continue
+                value = score(s.name)
+                scored[key] = (value, s)
+                if len(top) < limit:
+                    heapq.heappush(top, value)
+                elif value > top[0]:
+                    heapq.heapreplace(top, value)
+                if len(top) == limit and top[0] >= bound:
+                    break
+            else:
+                advance(cursors[w], ranked[w])
+
+        cut = max(min_score, top[0]) if len(top) == limit else min_score
+        best = [pair for pair in scored.values() if pair[0] >= cut]
+        return heapq.nsmallest(limit, best, key=lambda pair: (-pair[0], name_sort_key(pair[1])))
+
+
+
+#   FILTER EXPRESSIONS
+#
+#   exam < 40 and total > 100        comparisons with < <= > >= = !=
+#   any cw < 5    all cw >= 10       cw stands for cw1, cw2 and cw3
+#   name ~ sh    code ~ "10"         ~ matches the start of a name word or code
+#   not (name = "Ada Lovelace") or (exam >= 70)
+#
+#   Marks have small ranges, so each mark column (and total) keeps one
+#   bitmap per value, a Python int with bit i set for row i. A comparison
+#   ORs the bitmaps of the values it accepts, and and/or/not are single
+#   big-integer operations, so a query never visits the rows it rejects.
+
+FILTER_COLUMNS = MARK_COLUMNS + ("total",)
+FILTER_TEXT_COLUMNS = ("code", "name")
+FILTER_OPERATORS = {
+    "<": lambda a, b: a < b, "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b, ">=": lambda a, b: a >= b,
+    "=": lambda a, b: a == b, "==": lambda a, b: a == b, "!=": lambda a, b: a != b,
+}
+FILTER_TOKENS = re.compile(r'\s*(?:(<=|>=|!=|==|[<>=~()])|"([^"]*)"|([^\s<>=!~()"]+))')
+
+# Bit positions set in each byte value, for turning bitmaps back into rows
+_BYTE_BITS = tuple(tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256))
+_NONZERO_RUNS = re.compile(rb"[^\x00]+")
+
+
+class FilterError(ValueError):
+    """A filter expression could not be parsed; the message says where."""
+
+
+def _filter_tokens(text):
+    tokens, pos = [], 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = FILTER_TOKENS.match(text, pos)
+        if m is None:
+            raise FilterError(f"Unexpected {text[pos:].strip()[:10]!r}.")
+        op, quoted, word = m.groups()
+        if op is not None:
+            tokens.append(("op", op))
+        elif quoted is not None:
+            tokens.append(("text", quoted))
+        else:
+            tokens.append(("word", word))
+        pos = m.end()
+    return tokens
+
+def parse_filter(text):
+    """Parses a filter expression into a tree of tuples.
+
+    Nodes are ("and", a, b), ("or", a, b), ("not", a) and
+    ("cmp", column, operator, value). Raises FilterError.
+    """
+    tokens = _filter_tokens(text)
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else (None, None)
+
+    def take(expected=None):
+        nonlocal pos
+        kind, value = peek()
+        if kind is None:
+            raise FilterError("The filter ends too soon.")
+        if expected is not None and value != expected:
+            raise FilterError(f"Expected {expected!r} but found {value!r}.")
+        pos += 1
+        return kind, value
+
+    def keyword(word):
+        kind, value = peek()
+        return kind == "word" and value.lower() == word
+
+    def disjunction():
+        node = conjunction()
+        while keyword("or"):
+            take()
+            node = ("or", node, conjunction())
+        return node
+
+    def conjunction():
+        node = negation()
+        while keyword("and"):
+            take()
+            node = ("and", node, negation())
+        return node
+
+    def negation():
+        if keyword("not"):
+            take()
+            return ("not", negation())
+        if peek() == ("op", "("):
+            take()
+            node = disjunction()
+            take(")")
+            return node
+        return comparison()
+
+    def comparison():
+        quantifier = None
+        if keyword("any") or keyword("all"):
+            quantifier = take()[1].lower()
+        kind, column = take()
+        column = column.lower()
+        if kind != "word" or column not in FILTER_COLUMNS + FILTER_TEXT_COLUMNS + ("cw",):
+            raise FilterError(f"Unknown column {column!r}; use code, name, cw1, cw2, cw3, exam or total.")
+        if (column == "cw") != (quantifier is not None):
+            raise FilterError("Write 'any cw' or 'all cw' to compare every coursework mark.")
+        kind, op = take()
+        if kind != "op" or op not in FILTER_OPERATORS and op != "~":
+            raise FilterError(f"Expected a comparison after {column!r} but found {op!r}.")
+        kind, value = take()
+        if kind == "op":
+            raise FilterError(f"Expected a value after {op!r} but found {value!r}.")
+        if column in FILTER_TEXT_COLUMNS:
+            if op not in ("=", "==", "!=", "~"):
+                raise FilterError(f"{column} can only be compared with =, != or ~.")
+            return ("cmp", column, op, value)
+        if op == "~":
+            raise FilterError("~ only applies to code and name.")
+        try:
+            value = int(value)
+        except ValueError:
+            raise FilterError(f"{column} must be compared with a whole number, not {value!r}.")
+        if quantifier is None:
+            return ("cmp", column, op, value)
+        joiner = "or" if quantifier == "any" else "and"
+        first, second, third = (("cmp", c, op, value) for c in ("cw1", "cw2", "cw3"))
+        return (joiner, (joiner, first, second), third)
+
+    if not tokens:
+        raise FilterError("The filter is empty.")
+    tree = disjunction()
+    if pos < len(tokens):
+        raise FilterError(f"Unexpected {tokens[pos][1]!r}.")
+    return tree
+
+def rows_to_bitmap(rows):
+    """Returns a bitmap with the bits of the given row numbers set."""
+    if not rows:
+        return 0
+    data = bytearray(max(rows) // 8 + 1)
+    for row in rows:
+        data[row >> 3] |= 1 << (row & 7)
+    return int.from_bytes(data, "little")
+
+def bitmap_rows(bitmap):
+    """Returns the row numbers set in a bitmap, in ascending order."""
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    rows = []
+    for run in _NONZERO_RUNS.finditer(data):
+        base = run.start() * 8
+        for value in run.group():
+            rows.extend([base + bit for bit in _BYTE_BITS[value]])
+            base += 8
+    return rows
+
+
+class FilterIndex:
+    """Bitmap indexes over the mark columns and total, for filter expressions.
+
+    Rows are numbered in the order records were added, which is the
+    store's file order, so results come back in file order. Edits flip the
+    bits of the values that changed; deleted rows are left as gaps until
+    the next rebuild.
+    """
+
+    def __init__(self, students=()):
+        students = list(students)
+        self._rows = students
+        self._row_of = {student_key(s.code): i for i, s in enumerate(students)}
+        self._codes = sorted(self._row_of)
+        self._live = (1 << len(students)) - 1
+        self._values = {c: array("i", map(attrgetter(c), students)) for c in FILTER_COLUMNS}
+        self._bitmaps = {c: self._build(self._values[c]) for c in FILTER_COLUMNS}
+
+    @staticmethod
+    def _build(values):
+        """Returns {value: bitmap of the rows holding it} for one column."""
+        if not values:
+            return {}
+        numpy = load_numpy()
+        if numpy is not None:
+            column = numpy.frombuffer(values, dtype=numpy.intc)
+            return {int(v): int.from_bytes(numpy.packbits(column == v, bitorder="little").tobytes(), "little")
+                    for v in numpy.unique(column)}
+        rows = {}
+        for i, v in enumerate(values):
+            rows.setdefault(v, []).append(i)
+        return {v: rows_to_bitmap(r) for v, r in rows.items()}
+
+    def add(self, s):
+        row = len(self._rows)
+        key = student_key(s.code)
+        self._rows.append(s)
+        self._row_of[key] = row
+        insort(self._codes, key)
+        bit = 1 << row
+        self._live |= bit
+        for c in FILTER_COLUMNS:
+            value = getattr(s, c)
+            self._values[c].append(value)
+            self._bitmaps[c][value] = self._bitmaps[c].get(value, 0) | bit
+
+    def change(self, s):
+        """Moves an edited record's bits to its new values."""
+        row = self._row_of[student_key(s.code)]
+        bit = 1 << row
+        for c in FILTER_COLUMNS:
+            old, new = self._values[c][row], getattr(s, c)
+            if old != new:
+                self._bitmaps[c][old] &= ~bit
+                self._bitmaps[c][new] = self._bitmaps[c].get(new, 0) | bit
+                self._values[c][row] = new
+
+    def remove(self, s):
+        key = student_key(s.code)
+        row = self._row_of.pop(key)
+        del self._codes[bisect_left(self._codes, key)]
+        bit = 1 << row
+        self._rows[row] = None
+        self._live &= ~bit
+        for c in FILTER_COLUMNS:
+            self._bitmaps[c][self._values[c][row]] &= ~bit
+
+    def _compare(self, column, op, value):
+        test = FILTER_OPERATORS[op]
+        bitmaps = self._bitmaps[column]
+        accepted = [v for v in bitmaps if test(v, value)]
+        if len(accepted) * 2 <= len(bitmaps):
+            result = 0
+            for v in accepted:
+                result |= bitmaps[v]
+            return result
+        # Cheaper to OR the values it rejects and take the rest
+        result = 0
+        for v in bitmaps:
+            if not test(v, value):
+                result |= bitmaps[v]
+        return self._live & ~result
+
+    def _text(self, column, op, value, names):
+        text = value.strip().casefold()
+        if column == "name" and op == "~":
+            found = names.prefix(value)
+        elif column == "name":
+            found = [s for s in names.prefix(value) if s.name.casefold() == text]
+        elif op == "~":
+            codes = self._codes
+            start = i = bisect_left(codes, text)
+            while i < len(codes) and codes[i].startswith(text):
+                i += 1
+            return rows_to_bitmap([self._row_of[key] for key in codes[start:i]])
+        else:
+            found = [self._rows[self._row_of[text]]] if text in self._row_of else []
+        rows = rows_to_bitmap([self._row_of[student_key(s.code)] for s in found])
+        return self._live & ~rows if op == "!=" else rows
+
+    def evaluate(self, tree, names):
+        """Returns the bitmap of rows matching a parsed filter."""
+        kind = tree[0]
+        if kind == "and":
+            return self.evaluate(tree[1], names) & self.evaluate(tree[2], names)
+        if kind == "or":
+            return self.evaluate(tree[1], names) | self.evaluate(tree[2], names)
+        if kind == "not":
+            return self._live & ~self.evaluate(tree[1], names)
+        _, column, op, value = tree
+        if column in FILTER_TEXT_COLUMNS:
+            return self._text(column, op, value, names)
+        return self._compare(column, op, value)
+
+    def select(self, bitmap):
+        """Returns the records of the rows set in a bitmap, in file order."""
+        rows = self._rows
+        return [rows[i] for i in bitmap_rows(bitmap & self._live)]
+
+
+
+#   STORAGE BACKENDS
+
+class StorageBackend:
+    """Where a StudentStore keeps its records.
+
+    The store holds the records in memory and calls the backend to load
+    them and to persist each change as it is made.
+    """
+
+    def signature(self):
+        """Returns a value that changes whenever the stored data changes."""
+        raise NotImplementedError
+
+    def load(self, cancel=None, progress=None):
+        """Returns all records, in storage order."""
+        raise NotImplementedError
+
+    def upsert(self, students):
+        """Adds or replaces records."""
+        raise NotImplementedError
+
+    def delete(self, codes):
+        """Removes the records with the given codes."""
+        raise NotImplementedError
+
+    def write(self, changes):
+        """Persists a mixed list of ("+", record) and ("-", code) changes, in order."""
+        run_op, run = None, []
+        for op, payload in changes + [(None, None)]:
+            if op != run_op and run:
+                if run_op == "+":
+                    self.upsert(run)
+                else:
+                    self.delete(run)
+                run = []
+            run_op = op
+            run.append(payload)
+
+    def replace_all(self, students):
+        """Replaces everything stored with the given records."""
+        raise NotImplementedError
+
+    def add_many(self, students, everyone):
+        """Persists a batch of new records; everyone is the full record set after it."""
+        self.upsert(students)
+
+    def needs_compaction(self):
+        return False
+
+    def compact(self, students):
+        """Rewrites the storage from the full record set, if that helps it."""
+
+    def locked(self):
+        """Returns a context manager that keeps other writers out while held."""
+        return contextlib.nullcontext()
+
+    def changes(self):
+        """Returns the changes other writers made since the last load or call.
+
+        The result is a list of ("+", record) and ("-", code) pairs, or None
+        when the store has to reload everything instead.
+        """
+        return None
+
+    def written_signature(self):
+        """Returns the signature to remember right after one of our own writes.
+
+        The writer held locked(), so nobody else can have written since it
+        caught up, and that is simply the current signature.
+        """
+        return self.signature()
+
+
+class TextFileBackend(StorageBackend):
+    """The comma-separated (or .smb binary) data file plus its change journal.
+
+    Any number of processes can share the file. Writers take a FileLock
+    only for the length of a journal append or a compaction, and each
+    backend remembers how far into the journal it has read, so catching up
+    with other writers only reads the entries added since.
+    """
+
+    def __init__(self, path=DATA_FILE):
+        self.path = path
+        self.lock = FileLock(path)
+        self._snapshot = None
+        self._journal_offset = 0
+
+    def signature(self):
+        return (file_signature(self.path), file_signature(journal_path(self.path)))
+
+    def locked(self):
+        return self.lock
+
+    def load(self, cancel=None, progress=None):
+        # Under the lock, so a compaction cannot swap the snapshot and drop
+        # the journal between the two reads
+        with self.lock.reading():
+            self._snapshot = file_signature(self.path)
+            students = read_snapshot(self.path, cancel, progress)
+            changes, self._journal_offset = read_journal(self.path)
+        return apply_changes(students, changes) if changes else students
+
+    def changes(self):
+        with self.lock.reading():
+            if file_signature(self.path) != self._snapshot:
+                # Someone compacted the journal into a new snapshot
+                return None
+            changes, self._journal_offset = read_journal(self.path, self._journal_offset)
+        return changes
+
+    def _append(self, entries):
+        with self.lock:
+            append_journal(entries, self.path)
+            # Callers caught up first, so everything up to here has been seen
+            self._journal_offset = os.path.getsize(journal_path(self.path))
+
+    def _save(self, students):
+        with self.lock:
+            save_students(students, self.path)
+            self._snapshot = file_signature(self.path)
+            self._journal_offset = 0
+
+    def upsert(self, students):
+        self._append([journal_upsert(s) for s in students])
+
+    def delete(self, codes):
+        self._append([journal_delete(code) for code in codes])
+
+    def write(self, changes):
+        # Mixed changes still go out as one append
+        self._append([journal_upsert(p) if op == "+" else journal_delete(p) for op, p in changes])
+
+    def replace_all(self, students):
+        self._save(students)
+
+    def add_many(self, students, everyone):
+        entries = [journal_upsert(s) for s in students]
+        if sum(map(len, entries)) > JOURNAL_COMPACT_BYTES:
+            # Bigger than the journal allows, so write one fresh snapshot
+            self._save(everyone)
+        else:
+            self._append(entries)
+
+    def needs_compaction(self):
+        journal = file_signature(journal_path(self.path))
+        return journal is not None and journal[1] > JOURNAL_COMPACT_BYTES
+
+    def compact(self, students):
+        self._save(students)
+
+
+class SQLiteBackend(StorageBackend):
+    """A local SQLite database with indexes on code, name and total.
+
+    Each change is a single-row upsert or delete in its own transaction.
+    Besides loading, the backend answers search, sort and top/bottom
+    queries in SQL, which the command line uses without loading a store.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # Shared by the GUI and worker threads, one at a time
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS students (
+                    key   TEXT PRIMARY KEY,
+                    code  TEXT NOT NULL,
+                    name  TEXT NOT NULL,
+                    cw1   INTEGER NOT NULL,
+                    cw2   INTEGER NOT NULL,
+                    cw3   INTEGER NOT NULL,
+                    exam  INTEGER NOT NULL,
+                    total INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS students_name ON students (name COLLATE NOCASE);
+                CREATE INDEX IF NOT EXISTS students_total ON students (total);
+            """)
+
+    def close(self):
+        self._conn.close()
+
+    @staticmethod
+    def _row(s):
+        return (student_key(s.code),) + s.fields() + (s.total,)
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [Student(*row) for row in rows]
+
+    def _write(self, sql, rows):
+        with self._lock, self._conn:
+            self._conn.executemany(sql, rows)
+
+    _SELECT = "SELECT code, name, cw1, cw2, cw3, exam FROM students"
+    _UPSERT = """
+        INSERT INTO students (key, code, name, cw1, cw2, cw3, exam, total)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (key) DO UPDATE SET
+            code = excluded.code, name = excluded.name, cw1 = excluded.cw1,
+            cw2 = excluded.cw2, cw3 = excluded.cw3, exam = excluded.exam,
+            total = excluded.total
+    """
+
+    def signature(self):
+        # Changes whenever another connection commits to the database
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def load(self, cancel=None, progress=None):
+        check_cancelled(cancel)
+        return self._query(self._SELECT + " ORDER BY rowid")
+
+    def upsert(self, students):
+        self._write(self._UPSERT, [self._row(s) for s in students])
+
+    def delete(self, codes):
+        self._write("DELETE FROM students WHERE key = ?", [(student_key(code),) for code in codes])
+
+    def replace_all(self, students):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM students")
+            self._conn.executemany(self._UPSERT, [self._row(s) for s in students])
+
+    def find(self, code):
+        rows = self._query(self._SELECT + " WHERE key = ?", (student_key(code),))
+        return rows[0] if rows else None
+
+    def sorted_by_name(self, limit=-1, offset=0):
+        return self._query(self._SELECT + " ORDER BY name COLLATE NOCASE, key LIMIT ? OFFSET ?", (limit, offset))
+
+    def name_prefix(self, text, limit=-1):
+        """Matches as NameIndex.prefix does: the start of any word, or of the whole name if text has a space."""
+        text = " ".join(text.split())
+        if not text:
+            return []
+        pattern = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        where, params = "name LIKE ? ESCAPE '\\'", (pattern,)
+        if " " not in text:
+            where, params = where + " OR name LIKE ? ESCAPE '\\'", (pattern, "% " + pattern)
+        return self._query(self._SELECT + f" WHERE {where} ORDER BY name COLLATE NOCASE, key LIMIT ?",
+                           params + (limit,))
+
+    def top(self, n):
+        return self._query(self._SELECT + " ORDER BY total DESC, rowid LIMIT ?", (n,))
+
+    def bottom(self, n):
+        return self._query(self._SELECT + " ORDER BY total ASC, rowid LIMIT ?", (n,))
+
+
+class RemoteBackend(StorageBackend):
+    """A student_server.py instance, spoken to over one keep-alive HTTP connection.
+
+    The server numbers every change it makes. The backend remembers the
+    last number whose change it has applied and asks for the changes after
+    it, so other clients' edits arrive without reloading everything.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        parts = urlsplit(url)
+        self._host, self._port = parts.hostname, parts.port or 80
+        self._prefix = parts.path.rstrip("/")
+        self._conn = None
+        self._lock = threading.Lock()
+        self._epoch = None
+        self._version = 0
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def request(self, method, path, body=None, params=None):
+        """Sends one request and returns the decoded JSON reply. Raises ValueError on a 4xx reply."""
+        # Only server mode needs http.client, so other commands don't pay for importing it
+        import http.client
+
+        target = self._prefix + path + ("?" + urlencode(params) if params else "")
+        payload = None if body is None else json.dumps(body).encode()
+        headers = {"Content-Type": "application/json"} if payload is not None else {}
+        with self._lock:
+            for attempt in (1, 2):
+                if self._conn is None:
+                    self._conn = http.client.HTTPConnection(self._host, self._port, timeout=REMOTE_TIMEOUT)
+                try:
+                    self._conn.request(method, target, payload, headers)
+                    response = self._conn.getresponse()
+                    data = json.loads(response.read() or b"null")
+                    break
+                except (http.client.HTTPException, ConnectionError):
+                    # The server closed the kept-alive connection; retry once on a new one
+                    self.close()
+                    if attempt == 2:
+                        raise
+        if response.status >= 400:
+            raise ValueError(data.get("error", f"HTTP {response.status}") if isinstance(data, dict) else data)
+        return data
+
+    def signature(self):
+        reply = self.request("GET", "/version")
+        return (reply["epoch"], reply["version"])
+
+    def written_signature(self):
+        # Not the server's current number: other clients may have written
+        # since we caught up, and that must still look stale
+        return (self._epoch, self._version)
+
+    def load(self, cancel=None, progress=None):
+        reply = self.request("GET", "/version")
+        self._epoch, self._version = reply["epoch"], reply["version"]
+        students, params = [], {"sort": "code", "limit": REMOTE_PAGE_SIZE}
+        while True:
+            check_cancelled(cancel)
+            page = self.request("GET", "/students", params=params)
+            students.extend(map(Student.from_dict, page["students"]))
+            if progress is not None and page["count"]:
+                progress(min(len(students) / page["count"], 1.0))
+            if len(page["students"]) < REMOTE_PAGE_SIZE:
+                # Anything changed while paging comes back through changes()
+                return students
+            params["after"] = student_key(students[-1].code)
+
+    def changes(self):
+        reply = self.request("GET", "/changes", params={"since": self._version, "epoch": self._epoch})
+        if reply.get("reload"):
+            return None
+        self._version = reply["version"]
+        return [("+", Student.from_dict(p)) if op == "+" else ("-", p) for op, p in reply["changes"]]
+
+    def write(self, changes):
+        ops = [{"op": "put", "student": p.as_dict()} if op == "+" else {"op": "delete", "code": p}
+               for op, p in changes]
+        reply = self.request("POST", "/batch", {"ops": ops})
+        if reply["epoch"] == self._epoch and reply["first"] == self._version + 1:
+            # Nobody else's changes came between ours and the last we saw
+            self._version = reply["last"]
+
+    def upsert(self, students):
+        self.write([("+", s) for s in students])
+
+    def delete(self, codes):
+        self.write([("-", code) for code in codes])
+
+    def find(self, code):
+        try:
+            return Student.from_dict(self.request("GET", "/students/" + quote(code, safe="")))
+        except ValueError:
+            return None
+
+    def top(self, n):
+        return [Student.from_dict(d) for d in self.request("GET", "/top", params={"n": n})["students"]]
+
+    def bottom(self, n):
+        return [Student.from_dict(d) for d in self.request("GET", "/bottom", params={"n": n})["students"]]
+
+
+def open_backend(path=DATA_FILE):
+    """Returns the storage backend for a data file, chosen by its extension."""
+    if path.startswith("http://"):
+        return RemoteBackend(path)
+    if path.lower().endswith(SQLITE_SUFFIXES):
+        return SQLiteBackend(path)
+    return TextFileBackend(path)
+
+def convert_marks_file(src, dst):
+    """Copies all records between data files; the formats follow the extensions."""
+    open_backend(dst).replace_all(open_backend(src).load())
+
+def migrate_to_sqlite(text_path=DATA_FILE, db_path=None):
+    """One-shot copy of a text data file into a SQLite database. Returns the database path."""
+    db_path = db_path or os.path.splitext(text_path)[0] + ".db"
+    convert_marks_file(text_path, db_path)
+    return db_path
+
+
+
+#   STUDENT STORE
+
+class StudentStore:
+    """Keeps the student records in memory, indexed by case-folded code.
+
+    The data is loaded once through a storage backend and only re-read when
+    the backend reports that it changed, so lookups and edits no longer
+    reparse everything. Changes and reloads hold `lock`, so a background
+    thread can reload or compact the store while the GUI thread uses it.
+
+    Other processes may write to the same data file. Before each write the
+    store takes the backend's lock and catches up with their changes, and
+    every record carries a version so an edit can tell whether the record
+    moved on since it was read (see read_for_edit and update).
+    """
+
+    def __init__(self, path=DATA_FILE, backend=None):
+        self.path = path
+        self.backend = backend or open_backend(path)
+        self._records = {}
+        self._versions = {}
+        self._generation = 0
+        self._signature = None
+        self._loaded = False
+        self._listeners = []
+        self.ranking = RankingIndex()
+        # The name index is built on first use, and most runs never sort by
+        # name, so a load only pays for the ranking
+        self._names = None
+        # Built on the first fuzzy search, or by build_fuzzy_index, then
+        # kept up to date. _modified counts changes, to spot ones made
+        # while it was being built.
+        self._fuzzy = None
+        self._modified = 0
+        # Bitmap indexes for filter(), likewise built on first use
+        self._filter = None
+        # Mark columns for columns(), with the row of each code; built on
+        # first use, patched by adds and edits, dropped by deletes
+        self._columns = None
+        self._column_rows = None
+        self.lock = threading.RLock()
+        # Called instead of compacting inline when the journal grows too
+        # large, so the GUI can run the compaction in the background
+        self.compaction_hook = None
+
+    def subscribe(self, callback):
+        """Registers callback(action, student, old) to hear about every change.
+
+        action is "add", "update", "delete" or "reload". For updates, old holds
+        the field values from before the change; otherwise it is None. A reload
+        means the file changed on disk, or many records changed at once, and
+        everything should be re-read.
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, action, student=None, old=None):
+        for callback in self._listeners:
+            callback(action, student, old)
+
+    def _notify_all(self, events):
+        for event in events:
+            self._notify(*event)
+
+    def is_stale(self):
+        """Returns True if the records need (re)loading from disk."""
+        return not self._loaded or self.backend.signature() != self._signature
+
+    def refresh(self, cancel=None, progress=None):
+        """Reloads the records if the file changed. Returns True if it did.
+
+        Changes appended by other writers are applied one by one; only a new
+        snapshot means reading everything again. cancel and progress are
+        optional hooks for background loading: a threading.Event that aborts
+        the load with Cancelled, and a callable taking the fraction of the
+        file read so far.
+        """
+        signature = self.backend.signature()
+        if self._loaded and signature == self._signature:
+            return False
+
+        if self._loaded:
+            with self.lock:
+                changes = self.backend.changes()
+                if changes is not None:
+                    events = self._apply(changes, signature)
+            if changes is not None:
+                self._notify_all(events)
+                return True
+
+        # Parse and index outside the lock; only the swap needs it
+        records = self._read_all(cancel, progress)
+        with self.lock:
+            self._swap(records, signature)
+        self._notify("reload")
+        return True
+
+    def _read_all(self, cancel=None, progress=None):
+        records = {}
+        for s in self.backend.load(cancel, progress):
+            # Keep the first occurrence, as the old linear search did
+            records.setdefault(student_key(s.code), s)
+        check_cancelled(cancel)
+        return records
+
+    def _swap(self, records, signature):
+        self._records = records
+        self._rebuild_indexes()
+        # Versions only compare within one load of the data
+        self._versions = {}
+        self._generation += 1
+        self._modified += 1
+        self._signature = signature
+        self._loaded = True
+
+    def _catch_up(self):
+        """Applies other writers' changes. Returns the events to notify.
+
+        Called with `lock` held, and before a write also with the backend's
+        lock, so nothing can slip in between catching up and writing.
+        """
+        signature = self.backend.signature()
+        if self._loaded and signature == self._signature:
+            return []
+        changes = self.backend.changes() if self._loaded else None
+        if changes is None:
+            self._swap(self._read_all(), signature)
+            return [("reload", None, None)]
+        return self._apply(changes, signature)
+
+    def _apply(self, changes, signature):
+        """Applies journal changes from other writers to the records and indexes."""
+        events = []
+        for op, payload in changes:
+            if op == "+":
+                key = student_key(payload.code)
+                student = self._records.get(key)
+                if student is None:
+                    self._insert(key, payload)
+                    events.append(("add", payload, None))
+                else:
+                    old = student.copy()
+                    self._change(key, student, payload)
+                    events.append(("update", student, old))
+            else:
+                student = self._remove(student_key(payload))
+                if student is not None:
+                    events.append(("delete", student, None))
+        self._signature = signature
+        return events
+
+    def _rebuild_indexes(self):
+        self.ranking = RankingIndex(self._records.values())
+        self._names = None
+        self._fuzzy = None
+        self._filter = None
+        self._columns = None
+
+    def _bump(self, key):
+        self._versions[key] = self._versions.get(key, 0) + 1
+        self._modified += 1
+
+    def _insert(self, key, student):
+        self._records[key] = student
+        self.ranking.add(student)
+        if self._names is not None:
+            self._names.add(student)
+        if self._fuzzy is not None:
+            self._fuzzy.add(student)
+        if self._filter is not None:
+            self._filter.add(student)
+        if self._columns is not None:
+            self._column_rows[key] = len(self._column_rows)
+            for c, column in self._columns.items():
+                column.append(getattr(student, c))
+        self._bump(key)
+
+    def _change(self, key, student, fields):
+        self.ranking.remove(student)
+        if self._names is not None:
+            self._names.remove(student)
+        if self._fuzzy is not None:
+            self._fuzzy.remove(student)
+        student.update(fields)
+        self.ranking.add(student)
+        if self._names is not None:
+            self._names.add(student)
+        if self._fuzzy is not None:
+            self._fuzzy.add(student)
+        if self._filter is not None:
+            self._filter.change(student)
+        if self._columns is not None:
+            row = self._column_rows[key]
+            for c, column in self._columns.items():
+                column[row] = getattr(student, c)
+        self._bump(key)
+
+    def _remove(self, key):
+        student = self._records.pop(key, None)
+        if student is not None:
+            self.ranking.remove(student)
+            if self._names is not None:
+                self._names.remove(student)
+            if self._fuzzy is not None:
+                self._fuzzy.remove(student)
+            if self._filter is not None:
+                self._filter.remove(student)
+            self._columns = None
+            self._bump(key)
+        return student
+
+    def _written(self):
+        """Records our own write, compacting the backend once it asks for it."""
+        self._signature = self.backend.written_signature()
+        if self.backend.needs_compaction():
+            if self.compaction_hook is not None:
+                self.compaction_hook()
+            else:
+                self.compact()
+
+    def compact(self, cancel=None, progress=None):
+        """Folds the journal into a fresh snapshot of the data file."""
+        with self.lock, self.backend.locked():
+            # Other writers' entries must make it into the new snapshot
+            events = self._catch_up()
+            self.backend.compact(self._records.values())
+            self._signature = self.backend.signature()
+        self._notify_all(events)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, code):
+        return student_key(code) in self._records
+
+    def all(self):
+        """Returns all records in file order."""
+        return list(self._records.values())
+
+    def get(self, code):
+        """Returns the record for a code, or None if there is none."""
+        return self._records.get(student_key(code))
+
+    def version(self, code):
+        """Returns an opaque value that changes whenever the record changes."""
+        key = student_key(code)
+        return (self._generation, self._versions.get(key, 0))
+
+    def read_for_edit(self, code):
+        """Returns (copy of the record, version) to pass to update() as `expected`.
+
+        Returns None if there is no such record.
+        """
+        with self.lock:
+            student = self._records.get(student_key(code))
+            if student is None:
+                return None
+            return student.copy(), self.version(code)
+
+    def add(self, student):
+        """Adds a new record. Returns False if the code is already taken."""
+        key = student_key(student.code)
+        events = []
+        try:
+            with self.lock, self.backend.locked():
+                events = self._catch_up()
+                if key in self._records:
+                    return False
+                self._insert(key, student)
+                self.backend.upsert([student])
+                self._written()
+                events.append(("add", student, None))
+        finally:
+            self._notify_all(events)
+        return True
+
+    def add_many(self, students):
+        """Adds a batch of new records. Returns the ones that were added.
+
+        Records whose codes are already taken, perhaps by another writer since
+        the batch was checked, are left out. The batch is committed with a
+        single write: one journal append or transaction, or a fresh snapshot
+        when the batch alone would outgrow the journal.
+
+        A batch that is small next to the store goes through the indexes
+        record by record and is announced as adds; a large one rebuilds
+        them and is announced as a reload.
+        """
+        if not students:
+            return []
+        events = []
+        try:
+            with self.lock, self.backend.locked():
+                events = self._catch_up()
+                rebuild = len(students) * BATCH_REBUILD_RATIO > len(self._records)
+                added = []
+                for student in students:
+                    key = student_key(student.code)
+                    if key in self._records:
+                        continue
+                    if rebuild:
+                        self._records[key] = student
+                        self._bump(key)
+                    else:
+                        self._insert(key, student)
+                    added.append(student)
+                if rebuild:
+                    self._rebuild_indexes()
+                if added:
+                    self.backend.add_many(added, self._records.values())
+                    self._written()
+                if rebuild:
+                    events = [("reload", None, None)]
+                else:
+                    events += [("add", student, None) for student in added]
+        finally:
+            self._notify_all(events)
+        return added
+
+    def replace_all(self, students):
+        """Replaces every record, e.g. when restoring an archive, with one write."""
+        records = {}
+        for s in students:
+            records.setdefault(student_key(s.code), s)
+        with self.lock, self.backend.locked():
+            self.backend.replace_all(records.values())
+            self._swap(records, None)
+            self._written()
+        self._notify("reload")
+
+    def adopt(self, students, signature):
+        """Takes records loaded elsewhere, such as a worker process, as the loaded data.
+
+        signature is the backend's signature from before they were read. If
+        the data has changed since, the next refresh() reloads it.
+        """
+        records = {}
+        for s in students:
+            records.setdefault(student_key(s.code), s)
+        with self.lock:
+            self._swap(records, signature)
+        self._notify("reload")
+
+    def update(self, code, expected=None, **fields):
+        """Updates fields of an existing record. Returns it, or None if missing.
+
+        expected is the (record, version) pair from read_for_edit. If another
+        writer changed the record since, fields that only one side changed
+        are merged, and fields both sides changed differently raise
+        ConflictError, as does a record that was deleted in the meantime.
+        """
+        key = student_key(code)
+        events = []
+        try:
+            with self.lock, self.backend.locked():
+                events = self._catch_up()
+                student = self._records.get(key)
+                if student is None:
+                    if expected is not None:
+                        raise ConflictError(expected[0].code, [])
+                    return None
+                if expected is not None and self.version(code) != expected[1]:
+                    fields = merge_edit(expected[0], student, fields)
+                old = student.copy()
+                self._change(key, student, fields)
+                self.backend.upsert([student])
+                self._written()
+                events.append(("update", student, old))
+        finally:
+            self._notify_all(events)
+        return student
+
+    def delete(self, code):
+        """Removes a record. Returns the removed record, or None if missing."""
+        events = []
+        try:
+            with self.lock, self.backend.locked():
+                events = self._catch_up()
+                student = self._remove(student_key(code))
+                if student is None:
+                    return None
+                self.backend.delete([student.code])
+                self._written()
+                events.append(("delete", student, None))
+        finally:
+            self._notify_all(events)
+        return student
+
+    def apply_batch(self, operations):
+        """Applies many changes with a single write to the backend.
+
+        operations are ("add", student), ("update", code, fields),
+        ("put", student) and ("delete", code) tuples, where put adds or
+        replaces the record. Returns one result per operation, as add(),
+        update() and delete() would have; put returns the stored record.
+        """
+        results, changes, events = [], [], []
+        try:
+            with self.lock, self.backend.locked():
+                events = self._catch_up()
+                for op in operations:
+                    if op[0] == "add":
+                        student = op[1]
+                        key = student_key(student.code)
+                        if key in self._records:
+                            results.append(False)
+                            continue
+                        self._insert(key, student)
+                        changes.append(("+", student))
+                        events.append(("add", student, None))
+                        results.append(True)
+                    elif op[0] == "put":
+                        student = op[1]
+                        key = student_key(student.code)
+                        current = self._records.get(key)
+                        if current is None:
+                            self._insert(key, student)
+                            events.append(("add", student, None))
+                        else:
+                            old = current.copy()
+                            self._change(key, current, student)
+                            events.append(("update", current, old))
+                            student = current
+                        changes.append(("+", student))
+                        results.append(student)
+                    elif op[0] == "update":
+                        key = student_key(op[1])
+                        student = self._records.get(key)
+                        if student is None:
+                            results.append(None)
+                            continue
+                        old = student.copy()
+                        self._change(key, student, op[2])
+                        changes.append(("+", student))
+                        events.append(("update", student, old))
+                        results.append(student)
+                    else:
+                        student = self._remove(student_key(op[1]))
+                        if student is not None:
+                            changes.append(("-", student.code))
+                            events.append(("delete", student, None))
+                        results.append(student)
+                if changes:
+                    self.backend.write(changes)
+                    self._written()
+        finally:
+            self._notify_all(events)
+        return results
+
+    def top(self, n):
+        """Returns up to n students with the highest totals."""
+        return self.ranking.top(n)
+
+    def bottom(self, n):
+        """Returns up to n students with the lowest totals."""
+        return self.ranking.bottom(n)
+
+    @property
+    def names(self):
+        """The NameIndex, built on first use and then kept up to date."""
+        names = self._names
+        if names is None:
+            with self.lock:
+                if self._names is None:
+                    self._names = NameIndex(self._records.values())
+                names = self._names
+        return names
+
+    def sorted_by_name(self):
+        """Returns all records in name order."""
+        return self.names.sorted()
+
+    def build_name_index(self):
+        """Builds the name index, words included, without holding the lock.
+
+        Like build_fuzzy_index, the result is thrown away if the records
+        change in the meantime.
+        """
+        with self.lock:
+            if self._names is not None:
+                return
+            students, modified = list(self._records.values()), self._modified
+        index = NameIndex(students)
+        index.words()
+        with self.lock:
+            if self._names is None and self._modified == modified:
+                self._names = index
+
+    def build_fuzzy_index(self):
+        """Builds the fuzzy name index without holding the lock, e.g. on a spare thread.
+
+        If the records change in the meantime the result is thrown away and
+        the index is built on the first search instead.
+        """
+        with self.lock:
+            if self._fuzzy is not None:
+                return
+            students, modified = list(self._records.values()), self._modified
+        index = TrigramIndex(students)
+        with self.lock:
+            if self._fuzzy is None and self._modified == modified:
+                self._fuzzy = index
+
+    def fuzzy_search(self, text, limit=10):
+        """Returns up to limit (score, student) pairs with names like text, best first."""
+        with self.lock:
+            if self._fuzzy is None:
+                self._fuzzy = TrigramIndex(self._records.values())
+            return self._fuzzy.search(text, limit)
+
+    def filter(self, expression):
+        """Returns the records matching a filter expression, in file order.
+
+        expression is text such as "exam < 40 and total > 100" (see
+        parse_filter) or an already parsed tree. Raises FilterError.
+        """
+        tree = parse_filter(expression) if isinstance(expression, str) else expression
+        with self.lock:
+            if self._filter is None:
+                self._filter = FilterIndex(self._records.values())
+            return self._filter.select(self._filter.evaluate(tree, self.names))
+
+    def columns(self):
+        """Returns the marks as one integer array per column, in file order.
+
+        The arrays are copies of columns kept between calls, so refreshing
+        the statistics does not walk every record again.
+        """
+        with self.lock:
+            if self._columns is None:
+                records = self._records.values()
+                self._columns = {c: array("i", map(attrgetter(c), records)) for c in MARK_COLUMNS}
+                self._column_rows = {key: row for row, key in enumerate(self._records)}
+            return {c: array("i", column) for c, column in self._columns.items()}
+
+def merge_edit(base, current, fields):
+    """Three-way merges an edit made against `base` with the record as it is now.
+
+    Returns the fields to write. Fields the edit left alone keep their
+    current value; fields both sides changed to different values raise
+    ConflictError.
+    """
+    merged, clashes = {}, []
+    for field, value in fields.items():
+        ours = value != getattr(base, field)
+        theirs = getattr(current, field) != getattr(base, field)
+        if ours and theirs and value != getattr(current, field):
+            clashes.append(field)
+        elif ours:
+            merged[field] = value
+    if clashes:
+        raise ConflictError(current.code, clashes)
+    return merged
+
+
+
+#   COHORT DIRECTORIES
+
+def cohort_files(directory):
+    """Returns the marks files in a directory, sorted by name.
+
+    Journals, reject lists and lock files belong to a marks file and are
+    not cohorts of their own.
+    """
+    paths = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name.lower().endswith(COHORT_SUFFIXES) and os.path.isfile(path):
+            paths.append(path)
+    return paths
+
+def cohort_label(path):
+    """Returns the name a cohort file is shown under: its file name.
+
+    The extension stays, as "a.txt" and "a.db" in one directory are two
+    cohorts.
+    """
+    return os.path.basename(path)
+
+
+class CohortSummary:
+    """Aggregates of one or more cohorts that combine without revisiting the records.
+
+    Holds the student count, per-column sums and sums of squares, a
+    histogram of totals and the COHORT_EXTREMES best and worst results.
+    Adding two summaries gives exactly the summary of both cohorts
+    together, so each file can be summarised on its own, even in another
+    process, and the results merged afterwards.
+    """
+
+    COLUMNS = MARK_COLUMNS + ("total",)
+
+    def __init__(self):
+        self.count = 0
+        self.sums = dict.fromkeys(self.COLUMNS, 0)
+        self.squares = dict.fromkeys(self.COLUMNS, 0)
+        self.histogram = [0] * (MAX_TOTAL + 1)
+        # (total, code, name, cohort) tuples
+        self.best = []
+        self.worst = []
+
+    @classmethod
+    def from_students(cls, students, label):
+        summary = cls()
+        students = list(students)
+        summary.count = len(students)
+        for c in cls.COLUMNS:
+            column = array("q", map(attrgetter(c), students))
+            summary.sums[c] = sum(column)
+            summary.squares[c] = sum(map(mul, column, column))
+        for total, n in Counter(map(attrgetter("total"), students)).items():
+            summary.histogram[max(0, min(total, MAX_TOTAL))] += n
+        key = attrgetter("total")
+        summary.best = [(s.total, s.code, s.name, label) for s in heapq.nlargest(COHORT_EXTREMES, students, key)]
+        summary.worst = [(s.total, s.code, s.name, label) for s in heapq.nsmallest(COHORT_EXTREMES, students, key)]
+        return summary
+
+    def __add__(self, other):
+        merged = CohortSummary()
+        merged.count = self.count + other.count
+        for c in self.COLUMNS:
+            merged.sums[c] = self.sums[c] + other.sums[c]
+            merged.squares[c] = self.squares[c] + other.squares[c]
+        merged.histogram = list(map(add, self.histogram, other.histogram))
+        merged.best = heapq.nlargest(COHORT_EXTREMES, self.best + other.best, key=itemgetter(0))
+        merged.worst = heapq.nsmallest(COHORT_EXTREMES, self.worst + other.worst, key=itemgetter(0))
+        return merged
+
+    def mean(self, column="total"):
+        return self.sums[column] / self.count if self.count else math.nan
+
+    def std(self, column="total"):
+        """Population standard deviation, as cohort_statistics reports it."""
+        if not self.count:
+            return math.nan
+        mean = self.mean(column)
+        return math.sqrt(max(0.0, self.squares[column] / self.count - mean * mean))
+
+    def percentile(self, p):
+        """Returns the nearest-rank p-th percentile of the totals."""
+        if not self.count:
+            return math.nan
+        rank = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for total, n in enumerate(self.histogram):
+            seen += n
+            if seen >= rank:
+                return total
+        return MAX_TOTAL
+
+    def grades(self):
+        """Returns {grade: number of students}, best grade first."""
+        grades = dict.fromkeys((g for g, _ in GRADE_BANDS), 0)
+        for total, n in enumerate(self.histogram):
+            if n:
+                grades[grade_for(total)] += n
+        return grades
+
+
+def load_cohort(path):
+    """Loads one marks file for CohortSet, usually in a worker process.
+
+    Returns (signature, columns, summary). The records travel back as
+    columns (lists of codes and names, arrays of marks) because those
+    pickle far faster than a million record objects.
+    """
+    backend = open_backend(path)
+    # Taken first, so a change made while loading shows up as stale
+    signature = backend.signature()
+    records = {}
+    for s in backend.load():
+        records.setdefault(student_key(s.code), s)
+    students = list(records.values())
+    columns = {"code": [s.code for s in students], "name": [s.name for s in students]}
+    for c in MARK_COLUMNS:
+        columns[c] = array("i", map(attrgetter(c), students))
+    return signature, columns, CohortSummary.from_students(students, cohort_label(path))
+
+
+class CohortSet:
+    """Every marks file in a directory, such as one per module and year.
+
+    Each file gets its own StudentStore, with its own indexes, and can be
+    edited like the single data file. Files are read in parallel by a
+    process pool, which also summarises each one. Cross-cohort queries
+    combine the per-file indexes: top and bottom merge each store's own
+    ranking, and a merged index of codes maps every student to the cohorts
+    they appear in, for their history.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.paths = cohort_files(directory)
+        self.stores = {}
+        self.codes = {}
+        self._summaries = {}
+
+    def load(self, workers=PARSE_WORKERS, cancel=None, progress=None):
+        """Loads every cohort file. Returns the number of cohorts."""
+        results = {}
+        # Files big enough to be parsed in chunks get the whole pool to
+        # themselves, one after another, rather than a pool inside a worker
+        large = [p for p in self.paths if os.path.getsize(p) > PARALLEL_PARSE_BYTES]
+        small = [p for p in self.paths if p not in large]
+        for path in large:
+            results[path] = load_cohort(path)
+            check_cancelled(cancel)
+        if len(small) > 1 and sum(os.path.getsize(p) for p in small) > COHORT_PARALLEL_BYTES:
+            from concurrent.futures import ProcessPoolExecutor, as_completed
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(load_cohort, path): path for path in small}
+                try:
+                    for done, future in enumerate(as_completed(futures), 1):
+                        results[futures[future]] = future.result()
+                        check_cancelled(cancel)
+                        if progress is not None:
+                            progress((len(large) + done) / len(self.paths))
+                except Cancelled:
+                    for future in futures:
+                        future.cancel()
+                    raise
+        else:
+            # Small cohorts load faster than a pool starts up
+            for done, path in enumerate(small, len(large) + 1):
+                results[path] = load_cohort(path)
+                check_cancelled(cancel)
+                if progress is not None:
+                    progress(done / len(self.paths))
+
+        self.stores, self.codes, self._summaries = {}, {}, {}
+        for path in self.paths:
+            signature, columns, summary = results[path]
+            label = cohort_label(path)
+            store = StudentStore(path)
+            store.adopt(map(Student, *(columns[c] for c in Student.FIELDS)), signature)
+            self.stores[label] = store
+            self._summaries[label] = summary
+            self._index(label, store.all())
+            store.subscribe(functools.partial(self._changed, label))
+        return len(self.stores)
+
+    def _index(self, label, students):
+        for s in students:
+            self.codes.setdefault(student_key(s.code), []).append(label)
+
+    def _unindex(self, label, key):
+        labels = self.codes.get(key)
+        if labels and label in labels:
+            labels.remove(label)
+            if not labels:
+                del self.codes[key]
+
+    def _changed(self, label, action, student, old):
+        # The summary is recomputed the next time it is asked for
+        self._summaries.pop(label, None)
+        if action == "add":
+            self._index(label, [student])
+        elif action == "delete":
+            self._unindex(label, student_key(student.code))
+        elif action == "reload":
+            for key in list(self.codes):
+                self._unindex(label, key)
+            self._index(label, self.stores[label].all())
+
+    def __len__(self):
+        """Returns the number of distinct students across all cohorts."""
+        return len(self.codes)
+
+    def refresh(self):
+        """Picks up changes other programs made to any of the files."""
+        return [label for label, store in self.stores.items() if store.refresh()]
+
+    def summary(self, label):
+        """Returns the CohortSummary of one cohort."""
+        summary = self._summaries.get(label)
+        if summary is None:
+            summary = self._summaries[label] = CohortSummary.from_students(self.stores[label].all(), label)
+        return summary
+
+    def merged_summary(self):
+        """Returns the summary of all cohorts together, combined from the per-cohort ones."""
+        return sum((self.summary(label) for label in self.stores), CohortSummary())
+
+    def top(self, n):
+        """Returns the n best (cohort, student) results across every cohort."""
+        candidates = [(label, s) for label, store in self.stores.items() for s in store.top(n)]
+        return heapq.nlargest(n, candidates, key=lambda pair: pair[1].total)
+
+    def bottom(self, n):
+        """Returns the n worst (cohort, student) results across every cohort."""
+        candidates = [(label, s) for label, store in self.stores.items() for s in store.bottom(n)]
+        return heapq.nsmallest(n, candidates, key=lambda pair: pair[1].total)
+
+    def history(self, code):
+        """Returns (cohort, record) for every cohort a student appears in, in file order."""
+        labels = self.codes.get(student_key(code), [])
+        return [(label, self.stores[label].get(code)) for label in self.stores if label in labels]
+
+    def best_students(self, n, min_cohorts=1):
+        """Returns the n students with the best average total over their cohorts.
+
+        Each entry is (average total, code, name, number of cohorts); only
+        students in at least min_cohorts cohorts are ranked.
+        """
+        ranked = []
+        for key, labels in self.codes.items():
+            if len(labels) < min_cohorts:
+                continue
+            records = [self.stores[label].get(key) for label in labels]
+            average = sum(s.total for s in records) / len(records)
+            ranked.append((average, records[0].code, records[0].name, len(records)))
+        return heapq.nlargest(n, ranked, key=itemgetter(0))
+
+
+
+#   BULK IMPORT
+
+def validate_marks_batch(marks):
+    """Checks (cw1, cw2, cw3, exam) rows against MAX_CW/MAX_EXAM all at once.
+
+    Returns one bool per row.
+    """
+    if marks and load_numpy() is not None:
+        arr = np.array(marks, dtype=np.int64)
+        cw, exam = arr[:, :3], arr[:, 3]
+        ok = ((cw >= 0) & (cw <= MAX_CW)).all(axis=1) & (exam >= 0) & (exam <= MAX_EXAM)
+        return ok.tolist()
+    return [0 <= a <= MAX_CW and 0 <= b <= MAX_CW and 0 <= c <= MAX_CW and 0 <= e <= MAX_EXAM
+            for a, b, c, e in marks]
+
+def import_students(path, store, cancel=None, progress=None):
+    """Bulk-imports a CSV of code,name,cw1,cw2,cw3,exam rows into the store.
+
+    Rows are parsed first, then all marks are range-checked as one batch and
+    codes are checked against the store and each other with hash lookups.
+    Accepted rows are committed in a single write. Returns
+    (accepted count, list of (line, reason) for rejected rows).
+    """
+    candidates, rejected = [], []
+    size = os.path.getsize(path)
+    with open(path, "r", newline="") as f:
+        for row in csv.reader(track_progress(f, size, cancel, progress)):
+            # Quoted fields may hold line breaks; keep each reject on one line
+            line = ",".join(row).replace("\r", "\\r").replace("\n", "\\n")
+            if not row or row[0].strip().lower() == "code":
+                # Blank line or header row
+                continue
+            if len(row) != 6:
+                rejected.append((line, "expected 6 fields"))
+                continue
+            valid_code, code = validate_field("code", row[0])
+            valid_name, name = validate_field("name", row[1])
+            if not (valid_code and valid_name):
+                # The validator's message says what is wrong
+                rejected.append((line, name if valid_code else code))
+                continue
+            try:
+                marks = tuple(int(v) for v in row[2:])
+            except ValueError:
+                rejected.append((line, "marks must be integers"))
+                continue
+            candidates.append((code, name, marks, line))
+
+    in_range = validate_marks_batch([c[2] for c in candidates])
+    check_cancelled(cancel)
+
+    accepted, seen = [], set()
+    for (code, name, marks, line), ok in zip(candidates, in_range):
+        if not ok:
+            rejected.append((line, "marks out of range"))
+            continue
+        key = student_key(code)
+        if key in seen or code in store:
+            rejected.append((line, "duplicate student code"))
+            continue
+        seen.add(key)
+        accepted.append((Student(code, name, *marks), line))
+
+    # Another writer may have taken some of the codes in the meantime
+    added = store.add_many([s for s, line in accepted])
+    if len(added) < len(accepted):
+        added_ids = set(map(id, added))
+        rejected.extend((line, "duplicate student code") for s, line in accepted if id(s) not in added_ids)
+    return len(added), rejected
+
+def write_import_rejects(path, rejected):
+    """Writes rejected import rows, each with its reason, next to the CSV file."""
+    rejects_path = path + REJECTS_SUFFIX
+    with open(rejects_path, "w") as f:
+        for line, reason in rejected:
+            f.write(f"{line}  # {reason}\n")
+    return rejects_path
+
+
+
+#   REPORT EXPORT
+
+REPORT_COLUMNS = Student.FIELDS + ("total", "percent", "grade")
+
+def report_row(s):
+    """Returns a record's report cells: its fields, total, percentage and grade."""
+    total = s.total
+    return s.fields() + (total, f"{100 * total / MAX_TOTAL:.1f}", grade_for(total))
+
+def export_report(students, path, title="Student Records", cancel=None, progress=None):
+    """Writes records, in the order given, to a .csv or .html report. Returns the number written.
+
+    Rows are formatted and written EXPORT_CHUNK_ROWS at a time, so memory
+    use does not grow with the number of students. Totals, percentages and
+    grades are worked out per row as it is written, and the HTML report
+    ends with a summary counted along the way.
+    """
+    if path.lower().endswith(REPORT_HTML_SUFFIXES):
+        write = _write_html_report
+    else:
+        write = _write_csv_report
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        return write(students, f, title, cancel, progress)
+
+def _report_chunks(students, cancel, progress):
+    """Yields the records as successive lists of at most EXPORT_CHUNK_ROWS."""
+    total = len(students)
+    for start in range(0, total, EXPORT_CHUNK_ROWS):
+        check_cancelled(cancel)
+        yield students[start:start + EXPORT_CHUNK_ROWS]
+        if progress is not None:
+            progress(min(start + EXPORT_CHUNK_ROWS, total) / total)
+
+def _write_csv_report(students, f, title, cancel, progress):
+    writer = csv.writer(f, lineterminator="\n")
+    writer.writerow(REPORT_COLUMNS)
+    for chunk in _report_chunks(students, cancel, progress):
+        writer.writerows(map(report_row, chunk))
+    return len(students)
+
+def _write_html_report(students, f, title, cancel, progress):
+    title = html.escape(title)
+    f.write(f"<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n<title>{title}</title>\n"
+            f"<style>{REPORT_HTML_STYLE}</style>\n</head>\n<body>\n<h1>{title}</h1>\n"
+            f"<p>{len(students)} students, exported {time.strftime('%Y-%m-%d %H:%M')}.</p>\n"
+            "<table>\n<thead><tr>" + "".join(f"<th>{c}</th>" for c in REPORT_COLUMNS)
+            + "</tr></thead>\n<tbody>\n")
+    count = marks = 0
+    grades = dict.fromkeys((g for g, _ in GRADE_BANDS), 0)
+    row_html = "<tr>" + "<td>{}</td>" * len(REPORT_COLUMNS) + "</tr>\n"
+    for chunk in _report_chunks(students, cancel, progress):
+        lines = []
+        for s in chunk:
+            row = report_row(s)
+            count += 1
+            marks += row[-3]
+            grades[row[-1]] += 1
+            # Only the code and name are text; the rest are numbers and grades
+            lines.append(row_html.format(html.escape(row[0]), html.escape(row[1]), *row[2:]))
+        f.write("".join(lines))
+    f.write("</tbody>\n</table>\n<h2>Summary</h2>\n<table class=\"summary\">\n")
+    if count:
+        f.write(f"<tr><th>Mean total</th><td>{marks / count:.2f} / {MAX_TOTAL}</td></tr>\n")
+    for grade, n in grades.items():
+        share = 100 * n / count if count else 0
+        f.write(f"<tr><th>Grade {grade}</th><td>{n} ({share:.1f}%)</td></tr>\n")
+    f.write("</table>\n</body>\n</html>\n")
+    return count
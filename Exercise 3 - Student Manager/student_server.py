@@ -0,0 +1,534 @@
+"""A small HTTP/JSON server that shares one student store with many clients.
+
+    python student_server.py --file studentmarks.text.txt --port 8765
+    python "Student Manager.py" --server http://127.0.0.1:8765
+
+The server keeps the records in memory and answers over kept-alive
+HTTP/1.1 connections:
+
+    GET    /version                         {"epoch", "version", "count"}
+    GET    /students?offset&limit&sort&reverse   a page of records
+    GET    /students?sort=code&after=KEY&limit   the page after a code key
+    GET    /students/CODE                   one record
+    GET    /search?q&limit                  code, name prefix, then fuzzy matches
+    GET    /top?n    GET /bottom?n          highest and lowest totals
+    GET    /changes?since&epoch             changes after a version number
+    POST   /students                        add a record
+    PATCH  /students/CODE                   change fields of a record
+    DELETE /students/CODE                   remove a record
+    POST   /batch                           {"ops": [{"op": "put"|"delete", ...}]}
+
+Mutations from every connection go through one queue and are written to
+the data file in batches, so a burst of edits costs one journal append.
+Each change gets the next version number; clients ask for the changes
+after the last number they saw instead of reloading everything.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from student_core import (
+    DATA_FILE, MAX_CW, MAX_EXAM, MARK_COLUMNS, REMOTE_PAGE_SIZE, Student, StudentStore, student_key,
+    validate_field,
+)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Queued mutations are written together, up to this many operations a time
+MAX_BATCH_OPS = 500
+
+# Changes kept for /changes; clients further behind than this reload
+CHANGE_LOG_SIZE = 100000
+
+# How often the data file is checked for other writers' changes
+REFRESH_SECONDS = 1.0
+
+MAX_BODY_BYTES = 16 * 1024 * 1024
+SORT_ORDERS = ("file", "code", "name", "total")
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class RequestError(Exception):
+    """A request could not be served; sent back as {"error": message}."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def check_student(data, partial=False):
+    """Checks posted record fields and returns them converted.
+
+    With partial, only the fields present are checked (for PATCH).
+    Raises RequestError(400) describing the first problem.
+    """
+    if not isinstance(data, dict):
+        raise RequestError(400, "Expected a JSON object.")
+    fields = {}
+    for field in Student.FIELDS:
+        if field not in data:
+            if partial:
+                continue
+            raise RequestError(400, f"Missing field '{field}'.")
+        value = data[field]
+        if field in MARK_COLUMNS:
+            limit = MAX_EXAM if field == "exam" else MAX_CW
+            if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= limit:
+                raise RequestError(400, f"{field} must be an integer between 0 and {limit}.")
+        else:
+            if not isinstance(value, str):
+                raise RequestError(400, f"{field} must be a string.")
+            valid, value = validate_field(field, value)
+            if not valid:
+                raise RequestError(400, value)
+        fields[field] = value
+    return fields
+
+
+
+#   CHANGE LOG
+
+class ChangeLog:
+    """Numbers every change to the store and keeps the recent ones.
+
+    Entries are snapshots taken when the change happened, so later edits to
+    the same record cannot alter what an older version number returns. A
+    reload of the whole store starts a new epoch, and clients from the old
+    one are told to reload too.
+    """
+
+    def __init__(self, size=CHANGE_LOG_SIZE):
+        self.epoch = self._new_epoch()
+        self.version = 0
+        self.entries = deque(maxlen=size)
+
+    @staticmethod
+    def _new_epoch():
+        return format(time.time_ns(), "x")
+
+    def record(self, action, student, old):
+        if action == "reload":
+            self.epoch = self._new_epoch()
+            self.version = 0
+            self.entries.clear()
+            return
+        self.version += 1
+        if action == "delete":
+            self.entries.append(("-", student.code))
+        else:
+            self.entries.append(("+", student.as_dict()))
+
+    def since(self, version, epoch):
+        """Returns the changes after `version`, or None if they are no longer kept."""
+        if epoch != self.epoch or version > self.version:
+            return None
+        missing = self.version - version
+        if missing > len(self.entries):
+            return None
+        # Versions are consecutive, so the newest `missing` entries are the
+        # ones wanted; indexing a deque from the right end is cheap
+        return [self.entries[-i] for i in range(missing, 0, -1)]
+
+
+
+#   SERVER
+
+class StudentServer:
+    """Serves one StudentStore to any number of HTTP clients on one event loop.
+
+    Mutations are queued and committed by a single task with
+    StudentStore.apply_batch, so they are applied in arrival order and many
+    of them share one write. Writes and reloads run in the loop's thread
+    pool under the store lock, so clients are still answered while the disk
+    is busy. They change records and indexes in place, so reads run in the
+    pool under the lock too, and turn records into JSON there.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.log = ChangeLog()
+        self.store.subscribe(self.store_changed)
+        self.views = {}
+        # Counts log_change calls, so a view built while the store changed
+        # is not cached
+        self.view_generation = 0
+        self.mutations = None
+        self.requests_served = 0
+        self.loop = None
+
+    def store_changed(self, action, student, old):
+        if self.loop is not None and threading.current_thread() is not self.loop_thread:
+            # Changed by a write or reload in the thread pool. The log and
+            # views belong to the event loop, so hand the change over with
+            # a copy of the record as it is now; it may change again before
+            # the loop gets to it.
+            self.loop.call_soon_threadsafe(self.log_change, action, student and student.copy(), old)
+        else:
+            self.log_change(action, student, old)
+
+    def log_change(self, action, student, old):
+        self.log.record(action, student, old)
+        # Sorted pages are rebuilt on the next request for them
+        self.views.clear()
+        self.view_generation += 1
+
+    def locked(self, func, *args):
+        with self.store.lock:
+            return func(*args)
+
+    async def read(self, func, *args):
+        """Runs func(*args) in the thread pool with the store lock held."""
+        return await self.loop.run_in_executor(None, self.locked, func, *args)
+
+    @staticmethod
+    def as_dicts(students):
+        return [s.as_dict() for s in students]
+
+    def build_view(self, sort, reverse):
+        if sort == "name":
+            students = self.store.sorted_by_name()
+        elif sort == "total":
+            students = sorted(self.store.all(), key=lambda s: s.total)
+        elif sort == "code":
+            students = sorted(self.store.all(), key=lambda s: student_key(s.code))
+        else:
+            students = self.store.all()
+        if reverse:
+            students.reverse()
+        keys = [student_key(s.code) for s in students] if sort == "code" and not reverse else None
+        return students, keys
+
+    async def view(self, sort, reverse):
+        """Returns all records in the given order, cached until the next change."""
+        cached = self.views.get((sort, reverse))
+        if cached is None:
+            generation = self.view_generation
+            cached = await self.read(self.build_view, sort, reverse)
+            if generation == self.view_generation:
+                self.views[(sort, reverse)] = cached
+        return cached
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+        self.mutations = asyncio.Queue()
+        self.loop, self.loop_thread = asyncio.get_running_loop(), threading.current_thread()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        tasks = [asyncio.create_task(self.commit_loop()), asyncio.create_task(self.refresh_loop())]
+        if ready is not None:
+            ready(server)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def reload(self):
+        with self.store.lock:
+            if self.store.is_stale():
+                self.store.refresh()
+
+    def write(self, operations):
+        with self.store.lock:
+            results = self.store.apply_batch(operations)
+            # Records go back to the loop as copies, safe from the next batch
+            return [result.copy() if isinstance(result, Student) else result for result in results]
+
+    async def refresh_loop(self):
+        """Picks up changes other programs made to the data file."""
+        while True:
+            await asyncio.sleep(REFRESH_SECONDS)
+            try:
+                await self.loop.run_in_executor(None, self.reload)
+            except OSError as e:
+                print(f"student_server: could not reload: {e}", file=sys.stderr)
+
+    async def commit_loop(self):
+        """Writes queued mutations, taking everything waiting up to MAX_BATCH_OPS at once."""
+        while True:
+            batch = [await self.mutations.get()]
+            count = len(batch[0][0])
+            while count < MAX_BATCH_OPS and not self.mutations.empty():
+                batch.append(self.mutations.get_nowait())
+                count += len(batch[-1][0])
+            operations = [op for ops, _ in batch for op in ops]
+            try:
+                # The changes reach the log before this await returns: they
+                # were queued on the loop ahead of the executor's result
+                results = await self.loop.run_in_executor(None, self.write, operations)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            # Our changes were numbered last, after any other writer's that
+            # apply_batch caught up with; hand each request its own range
+            changed = sum(1 for op, result in zip(operations, results) if self.changed(op, result))
+            first = self.log.version - changed + 1
+            start = 0
+            for ops, future in batch:
+                mine = results[start:start + len(ops)]
+                count = sum(1 for op, result in zip(ops, mine) if self.changed(op, result))
+                if not future.done():
+                    future.set_result((mine, first, first + count - 1))
+                first += count
+                start += len(ops)
+
+    @staticmethod
+    def changed(op, result):
+        """True if apply_batch made a change for this operation."""
+        return result is not None and result is not False
+
+    async def mutate(self, operations):
+        """Queues operations for the commit task. Returns (results, first version, last version)."""
+        future = asyncio.get_running_loop().create_future()
+        await self.mutations.put((operations, future))
+        return await future
+
+
+
+    #   HTTP
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self.respond(writer, 413, {"error": "Request headers too large."}, False)
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self.respond(writer, 400, {"error": "Malformed request line."}, False)
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              if version == "HTTP/1.1" else headers.get("connection", "").lower() == "keep-alive")
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    await self.respond(writer, 413, {"error": "Request body too large."}, False)
+                    return
+                body = await reader.readexactly(length) if length else b""
+
+                try:
+                    status, payload = await self.dispatch(method, target, body)
+                except RequestError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+                self.requests_served += 1
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive):
+        data = json.dumps(payload, separators=(",", ":")).encode()
+        writer.write(f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                     f"Content-Type: application/json\r\n"
+                     f"Content-Length: {len(data)}\r\n"
+                     f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+        await writer.drain()
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        data = None
+        if body:
+            try:
+                data = json.loads(body)
+            except ValueError:
+                raise RequestError(400, "Body is not valid JSON.")
+
+        if path.startswith("/students/"):
+            code = unquote(path[len("/students/"):])
+            handler = {"GET": self.get_student, "PATCH": self.update_student,
+                       "DELETE": self.delete_student}.get(method)
+            if handler is None:
+                raise RequestError(405, f"{method} is not allowed on a record.")
+            return await handler(code, data)
+
+        routes = {
+            ("GET", "/version"): self.get_version,
+            ("GET", "/students"): self.list_students,
+            ("POST", "/students"): self.add_student,
+            ("GET", "/search"): self.search,
+            ("GET", "/top"): self.top,
+            ("GET", "/bottom"): self.bottom,
+            ("GET", "/changes"): self.changes,
+            ("POST", "/batch"): self.batch,
+        }
+        handler = routes.get((method, path))
+        if handler is None:
+            raise RequestError(404, f"No such endpoint: {method} {path}")
+        return await handler(params, data)
+
+
+
+    #   ENDPOINTS
+
+    @staticmethod
+    def int_param(params, name, default, low=0, high=None):
+        try:
+            value = int(params.get(name, default))
+        except ValueError:
+            raise RequestError(400, f"{name} must be an integer.")
+        if value < low or high is not None and value > high:
+            raise RequestError(400, f"{name} must be between {low} and {high}." if high is not None
+                               else f"{name} must be at least {low}.")
+        return value
+
+    async def get_version(self, params, data):
+        return 200, {"epoch": self.log.epoch, "version": self.log.version, "count": len(self.store)}
+
+    async def list_students(self, params, data):
+        sort = params.get("sort", "file")
+        if sort not in SORT_ORDERS:
+            raise RequestError(400, f"sort must be one of {', '.join(SORT_ORDERS)}.")
+        reverse = params.get("reverse", "0") not in ("0", "false", "")
+        limit = self.int_param(params, "limit", REMOTE_PAGE_SIZE, 1, REMOTE_PAGE_SIZE)
+        # Taken before reading: the page holds at least these changes, and
+        # replaying changes a client already has is harmless
+        epoch, version = self.log.epoch, self.log.version
+        students, keys = await self.view(sort, reverse)
+        if "after" in params:
+            if keys is None:
+                raise RequestError(400, "after needs sort=code without reverse.")
+            # Paging by key cannot skip or repeat records when others are
+            # added or deleted between pages
+            offset = bisect_right(keys, params["after"])
+        else:
+            offset = self.int_param(params, "offset", 0)
+        page = await self.read(self.as_dicts, students[offset:offset + limit])
+        return 200, {"count": len(students), "offset": offset, "students": page,
+                     "version": version, "epoch": epoch}
+
+    async def get_student(self, code, data):
+        def find():
+            student = self.store.get(code)
+            return None if student is None else student.as_dict()
+        student = await self.read(find)
+        if student is None:
+            raise RequestError(404, f"Student code '{code}' not found.")
+        return 200, student
+
+    async def search(self, params, data):
+        text = params.get("q", "").strip()
+        limit = self.int_param(params, "limit", 10, 1, REMOTE_PAGE_SIZE)
+
+        def find():
+            found = self.store.get(text) if text else None
+            if found is not None:
+                return [found.as_dict()]
+            return self.as_dicts(self.store.names.prefix(text, limit)
+                                 or [s for _, s in self.store.fuzzy_search(text, limit)])
+        return 200, {"students": await self.read(find)}
+
+    async def top(self, params, data):
+        n = self.int_param(params, "n", 1, 0, REMOTE_PAGE_SIZE)
+        return 200, {"students": await self.read(lambda: self.as_dicts(self.store.top(n)))}
+
+    async def bottom(self, params, data):
+        n = self.int_param(params, "n", 1, 0, REMOTE_PAGE_SIZE)
+        return 200, {"students": await self.read(lambda: self.as_dicts(self.store.bottom(n)))}
+
+    async def changes(self, params, data):
+        since = self.int_param(params, "since", 0)
+        changes = self.log.since(since, params.get("epoch"))
+        if changes is None:
+            return 200, {"reload": True, "epoch": self.log.epoch, "version": self.log.version}
+        return 200, {"changes": changes, "epoch": self.log.epoch, "version": self.log.version}
+
+    async def add_student(self, params, data):
+        student = Student(**check_student(data))
+        (added,), first, last = await self.mutate([("add", student)])
+        if not added:
+            raise RequestError(409, f"Student code '{student.code}' already exists.")
+        return 201, dict(student.as_dict(), version=last)
+
+    async def update_student(self, code, data):
+        fields = check_student(data, partial=True)
+        fields.pop("code", None)
+        if not fields:
+            raise RequestError(400, "Nothing to change.")
+        (student,), first, last = await self.mutate([("update", code, fields)])
+        if student is None:
+            raise RequestError(404, f"Student code '{code}' not found.")
+        return 200, dict(student.as_dict(), version=last)
+
+    async def delete_student(self, code, data):
+        (student,), first, last = await self.mutate([("delete", code)])
+        if student is None:
+            raise RequestError(404, f"Student code '{code}' not found.")
+        return 200, dict(student.as_dict(), version=last)
+
+    async def batch(self, params, data):
+        """Applies many puts and deletes as one unit of the commit queue.
+
+        The reply's first and last version numbers let the client tell
+        whether anyone else's changes landed in between.
+        """
+        if not isinstance(data, dict) or not isinstance(data.get("ops"), list):
+            raise RequestError(400, 'Expected {"ops": [...]}.')
+        operations = []
+        for op in data["ops"]:
+            kind = op.get("op") if isinstance(op, dict) else None
+            if kind == "put":
+                operations.append(("put", Student(**check_student(op.get("student")))))
+            elif kind == "delete" and isinstance(op.get("code"), str):
+                operations.append(("delete", op["code"]))
+            else:
+                raise RequestError(400, 'Each op must be {"op": "put", "student": {...}} or {"op": "delete", "code": ...}.')
+        results, first, last = await self.mutate(operations) if operations else ([], self.log.version + 1, self.log.version)
+        return 200, {"epoch": self.log.epoch, "first": first, "last": last,
+                     "results": [self.changed(op, result) for op, result in zip(operations, results)]}
+
+
+
+#   ARGUMENTS
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="student_server", description="Serve student records over HTTP/JSON.")
+    parser.add_argument("--file", default=DATA_FILE, help=f"data file (default: {DATA_FILE})")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"address to listen on (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port to listen on (default: {DEFAULT_PORT})")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    store = StudentStore(args.file)
+    store.refresh()
+    server = StudentServer(store)
+
+    def ready(listener):
+        print(f"Serving {len(store)} students from {args.file} on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        asyncio.run(server.serve(args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())